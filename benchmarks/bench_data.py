@@ -0,0 +1,171 @@
+"""
+ESP Benchmark Data
+Generate scaled synthetic inputs for the ESP apps: scrum boards, resource loader files and resumes.
+
+The same seed always gives the same data, so timings from different runs compare like for like.
+"""
+
+import os
+import json
+import random
+import string
+from datetime import datetime, timedelta
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRUM_SAMPLE = os.path.join(ROOT, 'esp_scrum_manager', 'esp_scrum_data.json')
+RESUME_SAMPLE = os.path.join(ROOT, 'esp_resume_maker', 'esp_resume_data.json')
+
+TIME_FORMAT = '%Y_%m_%d_%H_%M_%S'
+STATUSES = ['ToDo', 'In Progress', 'Review', 'Blocked', 'Complete']
+WORDS = ['Replace', 'Create', 'Review', 'Update', 'Migrate', 'Screen', 'Navigation', 'Alarm', 'Tag', 'Report',
+         'Pump', 'Valve', 'Tank', 'Cooling', 'Tower', 'Historian', 'Trend', 'Interlock', 'Export', 'Database']
+
+
+def make_name(rng, used):
+    """
+    Roll a 6 character resource name like EspApp.roll_name, without repeats.
+
+    :param rng: Random generator (random.Random)
+    :param used: Names already taken; the new name is added (set)
+    :return: Resource name (str)
+    """
+    x = ''.join(rng.choices(string.ascii_letters + string.digits, k=6))
+    while x in used:
+        x = ''.join(rng.choices(string.ascii_letters + string.digits, k=6))
+    used.add(x)
+    return x
+
+
+def make_text(rng, n):
+    """
+    :param rng: Random generator (random.Random)
+    :param n: Number of words (int)
+    :return: Resource text (str)
+    """
+    return ' '.join(rng.choice(WORDS) for _ in range(n))
+
+
+def make_board(n_projects, n_storys, n_tasks, seed=0, days=365):
+    """
+    Build a scrum board with N projects x M stories x K tasks, on top of the sample file's settings.
+
+    Each task gets a creation time and a log history of status updates spread over 'days' days.
+
+    :param n_projects: Number of projects (int)
+    :param n_storys: Stories per project, not counting Backlog (int)
+    :param n_tasks: Tasks per story (int)
+    :param seed: Random seed (int)
+    :param days: Length of the simulated history (int)
+    :return: ESP scrum data (dict)
+    """
+    rng = random.Random(seed)
+    with open(SCRUM_SAMPLE, 'r') as f:
+        d = json.load(f)
+    d.update({'projects': {}, 'project_paths': [], 'storys': [], 'tasks': [], 'resources': [], 'log': []})
+    used = set()
+    start = datetime(2020, 1, 1)
+    events = []
+    for _ in range(n_projects):
+        project = make_name(rng, used)
+        project_path = 'projects.' + project
+        created = start + timedelta(seconds=rng.randrange(days * 86400 // 4))
+        d['projects'][project] = {'type': 'project', 'text': 'Client ' + make_text(rng, 3), 'storys': {},
+                                  'time_created': created.strftime(TIME_FORMAT)}
+        d['project_paths'].insert(0, project_path)
+        d['resources'].insert(0, project)
+        events.append((created, 'Added Project ' + project_path))
+        for i in range(n_storys + 1):
+            story = make_name(rng, used)
+            story_path = project_path + '.storys.' + story
+            d['projects'][project]['storys'][story] = {'type': 'story', 'project': project,
+                                                       'text': 'Backlog' if i == 0 else make_text(rng, 6),
+                                                       'tasks': {}, 'time_created': created.strftime(TIME_FORMAT)}
+            d['storys'].insert(0, story_path)
+            d['resources'].insert(0, story)
+            events.append((created, 'Added Story ' + story_path))
+            for _ in range(n_tasks if i > 0 else 0):
+                task = make_name(rng, used)
+                task_path = story_path + '.tasks.' + task
+                added = created + timedelta(seconds=rng.randrange(days * 86400 // 2))
+                events.append((added, 'Added Task ' + task_path))
+                t = added
+                status = 'ToDo'
+                for new_status in STATUSES[1:rng.randrange(1, len(STATUSES) + 1)]:
+                    t = t + timedelta(seconds=rng.randrange(3600, 14 * 86400))
+                    status = new_status
+                    events.append((t, 'Updated ' + task_path + '.status to ' + status))
+                d['projects'][project]['storys'][story]['tasks'][task] = {
+                    'type': 'task', 'project': project, 'story': story, 'text': make_text(rng, 5),
+                    'status': status, 'time_created': added.strftime(TIME_FORMAT), 'notes': ''}
+                d['tasks'].insert(0, task_path)
+                d['resources'].insert(0, task)
+    events.sort(key=lambda k: k[0])
+    d['log'] = [k[1] + ' at ' + k[0].strftime(TIME_FORMAT) for k in events]
+    return d
+
+
+def make_resource_loader(n_projects, n_storys, n_tasks, seed=0, board=None, n_updates=0):
+    """
+    Write the text of a resource loader file (see example_resource_loader.txt) adding new resources,
+    then updating the status of existing tasks of a board.
+
+    Updates go through the slow path of the loader: a text search for the project, story and task
+    (get_project, get_story, get_task), then update_attribute.
+
+    :param n_projects: Number of projects (int)
+    :param n_storys: Stories per project (int)
+    :param n_tasks: Tasks per story (int)
+    :param seed: Random seed (int)
+    :param board: Board the update lines point at, from make_board (dict)
+    :param n_updates: Number of existing tasks to update, picked at random from board (int)
+    :return: Resource loader text (str)
+    """
+    rng = random.Random(seed)
+    lines = ['# Synthetic resource loader, ' + str(n_projects) + ' x ' + str(n_storys) + ' x ' + str(n_tasks)
+             + ', ' + str(n_updates) + ' updates']
+    for p in range(n_projects):
+        lines.append('Loaded Project ' + str(p) + ' ' + make_text(rng, 2))
+        for s in range(n_storys):
+            lines.append('\tLoaded Story ' + str(p) + '.' + str(s) + ' ' + make_text(rng, 4))
+            for _ in range(n_tasks):
+                lines.append('\t\t' + make_text(rng, 4) + ' - ' + rng.choice('TIRBC'))
+    for task_path in rng.sample(board['tasks'], n_updates) if n_updates else []:
+        [_, project, _, story, _, task] = task_path.split('.')
+        p = board['projects'][project]
+        lines.append(':' + p['text'])
+        lines.append('\t:' + p['storys'][story]['text'])
+        lines.append('\t\t:' + p['storys'][story]['tasks'][task]['text'] + ' - ' + rng.choice('TIRBC'))
+    return '\n'.join(lines) + '\n'
+
+
+def make_resume(n_lines, seed=0):
+    """
+    Build a long resume by repeating the sample resume's sections with fresh bullet text.
+
+    :param n_lines: Number of resume lines (int)
+    :param seed: Random seed (int)
+    :return: ESP resume data (dict)
+    """
+    rng = random.Random(seed)
+    with open(RESUME_SAMPLE, 'r') as f:
+        d = json.load(f)
+    sample = d['resume']
+    body = [k for k in sample if k.split('|')[1] in ['Hdr1', 'Bull', 'Text']]
+    lines = list(sample)
+    while len(lines) < n_lines:
+        [indent, fmat, _] = rng.choice(body).split('|')
+        lines.append('|'.join([indent, fmat, make_text(rng, rng.randrange(4, 24))]))
+    d['resume'] = lines[:n_lines]
+    return d
+
+
+def write_json(d, data_file):
+    """
+    Save generated data in the same layout as EspApp.write_esp_data.
+
+    :param d: Data (dict)
+    :param data_file: Target json file (str)
+    """
+    with open(data_file, 'w') as f:
+        json.dump(d, f, indent=4, sort_keys=True)
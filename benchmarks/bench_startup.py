@@ -0,0 +1,79 @@
+"""
+ESP Startup Benchmark
+Measure startup import time of the ESP apps with 'python -X importtime'.
+
+Each app module is imported and its EspApp is loaded from the sample JSON file, the same
+as the start of a console session. Fails (exit code 1) if a heavy output back end is
+imported by then, or if the cumulative import time of an app module goes over its budget.
+
+Usage: python bench_startup.py [runs]
+"""
+
+import os
+import sys
+import subprocess
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# app module: (folder, sample JSON file, modules that must not load at startup, budget in microseconds)
+# Budgets are about twice the measured import time (11-18 ms and 8-10 ms), so a regression that
+# pulls a heavy module back into startup fails even on a slower machine.
+TARGETS = {
+    'esp_scrum': ('esp_scrum_manager', 'esp_scrum_data.json', ['openpyxl', 'docx', 'numpy'], 35000),
+    'esp_resume_maker': ('esp_resume_maker', 'esp_resume_data.json', ['openpyxl', 'docx'], 20000),
+}
+
+
+def read_importtime(module, folder, data_file):
+    """
+    Start an app in a fresh interpreter and parse the -X importtime report.
+
+    :param module: Module name to import (str)
+    :param folder: Folder containing the module (str)
+    :param data_file: JSON file the app is loaded from (str)
+    :return: Cumulative microseconds per imported module (dict)
+    """
+    code = 'import ' + module + '; ' + module + ".EspApp('" + data_file + "', '" + data_file + "')"
+    cmd = [sys.executable, '-X', 'importtime', '-c', code]
+    result = subprocess.run(cmd, cwd=os.path.join(ROOT, folder), capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError('Could not import ' + module + ':\n' + result.stderr)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        [_, cumulative, name] = line.replace('import time:', '').split('|')
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def check_module(module, runs):
+    """
+    Time the import of one app module and check it against its budget.
+
+    :param module: Key in TARGETS (str)
+    :param runs: Number of fresh interpreters to sample; the fastest is kept (int)
+    :return: List of failure messages, empty if the module passed (list)
+    """
+    [folder, data_file, forbidden, budget] = TARGETS[module]
+    samples = [read_importtime(module, folder, data_file) for _ in range(runs)]
+    best = min(k[module] for k in samples)
+    failures = []
+    loaded = [k for k in forbidden if any(n == k or n.startswith(k + '.') for n in samples[0])]
+    for k in loaded:
+        failures.append(module + ' imports ' + k + ' at startup')
+    if best > budget:
+        failures.append(module + ' took ' + str(best) + ' us to import (budget ' + str(budget) + ' us)')
+    print(module.ljust(20) + str(best).rjust(10) + ' us  (budget ' + str(budget) + ' us)')
+    return failures
+
+
+if __name__ == '__main__':
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    failures = []
+    for k in TARGETS:
+        failures.extend(check_module(k, runs))
+    for k in failures:
+        print('FAIL: ' + k)
+    sys.exit(1 if failures else 0)
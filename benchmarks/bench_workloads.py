@@ -0,0 +1,169 @@
+"""
+ESP Workload Benchmark
+Time the scrum manager and resume maker on synthetic data sized by bench_settings.json.
+
+Each run is appended to the results file as one JSON record (time, commit, sizes and the
+min/median seconds of every workload), so regressions can be tracked over time.
+
+Usage: python bench_workloads.py [settings.json]
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import shutil
+import tempfile
+import platform
+import statistics
+import subprocess
+import contextlib
+from bench_data import ROOT, make_board, make_resource_loader, make_resume, write_json
+
+sys.path.insert(0, os.path.join(ROOT, 'esp_scrum_manager'))
+sys.path.insert(0, os.path.join(ROOT, 'esp_resume_maker'))
+import esp_scrum
+import esp_resume_maker
+
+
+class EspBenchmark:
+    """
+    Generate the synthetic inputs once, then time each workload 'repeat' times.
+    """
+
+    def __init__(self, settings_file):
+        """
+        :param settings_file: Path to benchmark settings JSON file (str)
+        """
+        with open(settings_file, 'r') as f:
+            self.s = json.load(f)
+        self.settings_file = settings_file
+        self.tmp = tempfile.mkdtemp(prefix='esp_bench_')
+        self.board_file = os.path.join(self.tmp, 'board.json')
+        self.loader_file = os.path.join(self.tmp, 'loader.txt')
+        self.resume_file = os.path.join(self.tmp, 'resume.json')
+        self.results = {}
+
+    def generate(self):
+        """
+        Write the synthetic board, resource loader and resume into the temp folder.
+        """
+        b = self.s['board']
+        board = make_board(b['projects'], b['storys'], b['tasks'], self.s['seed'], self.s['history_days'])
+        write_json(board, self.board_file)
+        n = self.s['loader']
+        with open(self.loader_file, 'w') as f:
+            f.write(make_resource_loader(n['projects'], n['storys'], n['tasks'], self.s['seed'],
+                                         board, n.get('updates', 0)))
+        resume = make_resume(self.s['resume_lines'], self.s['seed'])
+        resume['parameters']['word_output'] = os.path.join(self.tmp, 'resume.docx')
+        write_json(resume, self.resume_file)
+
+    def time_workload(self, name, setup, workload):
+        """
+        Time a workload on fresh state from setup, 'repeat' times.
+
+        :param name: Workload name used in the results (str)
+        :param setup: Builds the workload's input, not timed (function)
+        :param workload: Function of the setup result to be timed (function)
+        """
+        samples = []
+        for _ in range(self.s['repeat']):
+            state = setup()
+            start = time.perf_counter()
+            workload(state)
+            samples.append(time.perf_counter() - start)
+        self.results[name] = {'min': min(samples), 'median': statistics.median(samples), 'samples': samples}
+        print(name.ljust(24) + ('%.4f s' % min(samples)).rjust(14))
+
+    def run(self):
+        """
+        Generate the data, time every workload and append the results to the results file.
+        """
+        self.generate()
+        board = lambda: esp_scrum.EspApp(self.board_file, self.board_file)
+        out_file = os.path.join(self.tmp, 'out.json')
+        xlsx_file = os.path.join(self.tmp, 'SCRUM.xlsx')
+
+        self.time_workload('load', board, lambda a: a.read_esp_data(self.board_file))
+        self.time_workload('save', board, lambda a: a.write_esp_data(out_file))
+        self.time_workload('bulk_import', board, lambda a: a.read_resource_loader(self.loader_file))
+        self.time_workload('cascading_delete', board, lambda a: a.del_project(a.d['project_paths'][0]))
+        self.time_workload('search', board, self.search)
+        self.time_workload('get_project_table', board,
+                           lambda a: [a.get_project_table(k) for k in a.d['project_paths']])
+        self.time_workload('print_scrum_board', board, self.print_board)
+        self.time_workload('print_to_excel', board, lambda a: a.print_to_excel(a.d['project_paths'], xlsx_file))
+        self.time_workload('refresh_excel', lambda: self.change_one_task(board(), xlsx_file),
+                           lambda a: a.refresh_excel(xlsx_file))
+        self.time_workload('analytics', board, lambda a: a.get_analytics().summary(a.d))
+        self.time_workload('render_docx', lambda: esp_resume_maker.EspApp(self.resume_file, self.resume_file),
+                           lambda a: a.run())
+        self.save_results()
+
+    def search(self, a):
+        """
+        Look up the last-indexed projects, stories and tasks by text, the slowest case for get_*.
+
+        :param a: Scrum app (esp_scrum.EspApp)
+        """
+        for k in range(1, self.s['search_queries'] + 1):
+            story = a.d['storys'][-k]
+            a.get_project(a.d[a.d['project_paths'][-1]]['text'])
+            a.get_story('.'.join(story.split('.')[:2]), a.d[story]['text'])
+            a.get_task(a.d[a.d['tasks'][-k]]['text'])
+
+    def change_one_task(self, a, xlsx_file):
+        """
+        Export the board, then change one task, so refresh_excel has one sheet to rewrite.
+
+        :param a: Scrum app (esp_scrum.EspApp)
+        :param xlsx_file: .xlsx filename (str)
+        :return: The same app (esp_scrum.EspApp)
+        """
+        a.print_to_excel(a.d['project_paths'], xlsx_file)
+        a.update_attribute(a.d['tasks'][0], 'status', 'Blocked')
+        return a
+
+    def print_board(self, a):
+        """
+        Print every project board to a buffer instead of the console.
+
+        :param a: Scrum app (esp_scrum.EspApp)
+        """
+        with contextlib.redirect_stdout(io.StringIO()):
+            a.print_scrum_board(a.d['project_paths'])
+
+    def save_results(self):
+        """
+        Append this run to the results file, next to the settings file.
+        """
+        results_file = os.path.join(os.path.dirname(os.path.abspath(self.settings_file)), self.s['results_file'])
+        history = []
+        if os.path.exists(results_file):
+            with open(results_file, 'r') as f:
+                history = json.load(f)
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True)
+        history.append({
+            'time': time.strftime('%Y_%m_%d_%H_%M_%S'),
+            'commit': commit.stdout.strip(),
+            'python': platform.python_version(),
+            'settings': {k: self.s[k] for k in ['board', 'loader', 'resume_lines', 'search_queries', 'seed']},
+            'results': self.results,
+        })
+        with open(results_file, 'w') as f:
+            json.dump(history, f, indent=4, sort_keys=True)
+        print('Results appended to ' + results_file)
+
+    def close(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    here = os.path.dirname(os.path.abspath(__file__))
+    B = EspBenchmark(sys.argv[1] if len(sys.argv) > 1 else os.path.join(here, 'bench_settings.json'))
+    try:
+        B.run()
+    finally:
+        B.close()
@@ -0,0 +1,142 @@
+"""
+ESP Profiler
+Per-operation timing for the ESP apps, switched on from the 'profiling' dict of their JSON files.
+
+The apps add this folder to sys.path and import profiled and get_profiler from here.
+"""
+
+import time
+import atexit
+import functools
+import threading
+import contextlib
+
+
+_profilers = {}  # output file: EspProfiler, one per process
+_profilers_lock = threading.Lock()
+
+
+def profiled(method):
+    """
+    Time an EspApp method with self.profiler, if profiling is switched on in the JSON file.
+    Times are inclusive: a method that calls other profiled methods counts their time too.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        profiler = getattr(self, 'profiler', None)
+        if profiler is None:
+            return method(self, *args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            profiler.record(method.__name__, time.perf_counter() - start)
+    return wrapper
+
+
+def get_profiler(settings):
+    """
+    Get this process's profiler for settings['output'], starting it on first use.
+
+    Every app in the process that writes to the same output file shares one profiler, so their
+    counts add up into one report instead of each app overwriting the others' at exit.
+
+    :param settings: 'profiling' dict from the ESP JSON file (dict)
+    :return: Shared profiler (EspProfiler)
+    """
+    output = settings.get('output', 'esp_profile.txt')
+    with _profilers_lock:
+        if output not in _profilers:
+            _profilers[output] = EspProfiler(settings)
+        return _profilers[output]
+
+
+class EspProfiler:
+    """
+    Per-operation timers and counters, with a summary report or a cProfile dump on exit.
+
+    Settings come from the 'profiling' dict of the ESP JSON file:
+        enabled: Switch profiling on (bool)
+        mode: 'summary' for a timing table, 'cprofile' to also dump pstats (str)
+        output: File the report or pstats dump is written to (str)
+
+    Use get_profiler() rather than creating one directly. record() is safe to call from
+    several threads; cProfile only sees the thread that started the profiler.
+    """
+
+    def __init__(self, settings):
+        """
+        :param settings: 'profiling' dict from the ESP JSON file (dict)
+        """
+        self.mode = settings.get('mode', 'summary')
+        self.output = settings.get('output', 'esp_profile.txt')
+        self.timings = {}  # name: [calls, total seconds, max seconds]
+        self.lock = threading.Lock()
+        self.profile = None
+        self.closed = False
+        if self.mode == 'cprofile':
+            import cProfile
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+        atexit.register(self.close)
+
+    def record(self, name, seconds):
+        """
+        Add one timed call to the counters.
+
+        :param name: Operation name (str)
+        :param seconds: Duration of the call (float)
+        """
+        with self.lock:
+            if name not in self.timings:
+                self.timings[name] = [0, 0.0, 0.0]
+            entry = self.timings[name]
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds)
+
+    @contextlib.contextmanager
+    def timer(self, name):
+        """
+        Time a block of code that is not a method of its own.
+
+        :param name: Operation name (str)
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def report(self):
+        """
+        Format the counters as a table, slowest total first.
+
+        :return: Report text (str)
+        """
+        with self.lock:
+            timings = {k: list(v) for k, v in self.timings.items()}
+        lines = ['Operation'.ljust(24) + 'Calls'.rjust(10) + 'Total ms'.rjust(12) + 'Mean ms'.rjust(12)
+                 + 'Max ms'.rjust(12)]
+        for name in sorted(timings, key=lambda k: -timings[k][1]):
+            [calls, total, longest] = timings[name]
+            lines.append(name.ljust(24) + str(calls).rjust(10) + ('%.3f' % (total * 1000)).rjust(12)
+                         + ('%.3f' % (total * 1000 / calls)).rjust(12) + ('%.3f' % (longest * 1000)).rjust(12))
+        return '\n'.join(lines)
+
+    def close(self):
+        """
+        Print the report and write it, or the cProfile stats, to the output file. Runs once, at exit.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        report = self.report()
+        print('')
+        print(report)
+        if self.profile is not None:
+            self.profile.disable()
+            self.profile.dump_stats(self.output)
+        else:
+            with open(self.output, 'w') as f:
+                f.write(report + '\n')
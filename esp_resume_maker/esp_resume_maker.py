@@ -5,10 +5,19 @@ Evan McKee
 """
 
 
+import os
+import sys
 import json
-from docx import Document
-from docx.shared import Pt, Inches, RGBColor
-from docx.enum.text import WD_ALIGN_PARAGRAPH
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Shared esp_profiler.py
+try:
+    from esp_profiler import profiled, get_profiler
+except ImportError:  # App folder copied on its own: run without profiling
+    get_profiler = None
+
+    def profiled(method):
+        return method
 
 
 class EspApp:
@@ -30,9 +39,25 @@ class EspApp:
         """
         
         # Read in the JSON data / input variables
+        self.profiler = None
+        start = time.perf_counter()
         self.d = self.read_esp_data(esp_data)
+        if self.d.get('profiling', {}).get('enabled', False) and get_profiler is not None:
+            self.profiler = get_profiler(self.d['profiling'])
+            self.profiler.record('read_esp_data', time.perf_counter() - start)
 
         self.output_file = output_file
+        self.doc = None
+        self.section = None
+
+    def run(self):
+        """
+        Write the marked up resume using 'resume' and 'format' dicts.
+        """
+        # Imported here so python-docx only loads when a resume is actually rendered.
+        from docx import Document
+        from docx.shared import Inches
+
         self.doc = Document()
         self.section = self.doc.sections[0]
         margins = self.d['parameters']['margins_tbl']
@@ -41,48 +66,60 @@ class EspApp:
         self.section.left_margin = Inches(margins[2])
         self.section.right_margin = Inches(margins[3])
 
-    def run(self):
-        """
-        Write the marked up resume using 'resume' and 'format' dicts.
+        for line in self.d['resume']:
+            self.render_line(line)
+
+        if self.profiler is None:
+            self.doc.save(self.d['parameters']['word_output'])
+        else:
+            with self.profiler.timer('save_docx'):
+                self.doc.save(self.d['parameters']['word_output'])
+
+    @profiled
+    def render_line(self, line):
         """
+        Add one marked up resume line to the document as a formatted paragraph.
 
-        for line in self.d['resume']:
-            [indent, fmat, txt] = line.split('|')
-            p = self.doc.add_paragraph()
-            p_f = p.paragraph_format
-            style = {}
-            for entry in ['Font', "Size", "Bold", "Special", "Color", "Alignment", "Bullets", "Underline"]:
-                if entry in self.d['formats'][fmat]:
-                    style[entry] = self.d['formats'][fmat][entry]
-                else:
-                    style[entry] = self.d['formats']['Text'][entry]  # 'Text' style is default
-            if style['Bullets'] is True:
-                p.style = 'List Bullet'
-            if style['Alignment'] == 'Left':
-                p_f.alignment = WD_ALIGN_PARAGRAPH.LEFT
-            else:
-                p_f.alignment = WD_ALIGN_PARAGRAPH.CENTER
-                # Bring to center by splitting into n lines
-            # Add text
-            thisrun = p.add_run(txt)
-            if style['Special'] == 'All Caps':
-                thisrun.font.all_caps = True
-            elif style['Special'] == 'Small Caps':
-                thisrun.font.small_caps = True
+        :param line: Resume line, 'indent|format|text' (str)
+        """
+        from docx.shared import Pt, Inches, RGBColor
+        from docx.enum.text import WD_ALIGN_PARAGRAPH
+
+        [indent, fmat, txt] = line.split('|')
+        p = self.doc.add_paragraph()
+        p_f = p.paragraph_format
+        style = {}
+        for entry in ['Font', "Size", "Bold", "Special", "Color", "Alignment", "Bullets", "Underline"]:
+            if entry in self.d['formats'][fmat]:
+                style[entry] = self.d['formats'][fmat][entry]
             else:
-                thisrun.font.all_caps = False
-                thisrun.font.small_caps = False
-            p_f.left_indent = Inches(int(indent) * self.d['parameters']['cascade_indent'])
-            thisrun.font.name = style['Font']
-            thisrun.font.size = Pt(style['Size'])
-            c = style['Color']
-            thisrun.font.color.rgb = RGBColor(c, c, c)
-            thisrun.font.bold = style['Bold']
-            thisrun.font.underline = style['Underline']
-            p_f.space_after = Pt(self.d['parameters']['vertical_spacing'])
-
-        self.doc.save(self.d['parameters']['word_output'])
-
+                style[entry] = self.d['formats']['Text'][entry]  # 'Text' style is default
+        if style['Bullets'] is True:
+            p.style = 'List Bullet'
+        if style['Alignment'] == 'Left':
+            p_f.alignment = WD_ALIGN_PARAGRAPH.LEFT
+        else:
+            p_f.alignment = WD_ALIGN_PARAGRAPH.CENTER
+            # Bring to center by splitting into n lines
+        # Add text
+        thisrun = p.add_run(txt)
+        if style['Special'] == 'All Caps':
+            thisrun.font.all_caps = True
+        elif style['Special'] == 'Small Caps':
+            thisrun.font.small_caps = True
+        else:
+            thisrun.font.all_caps = False
+            thisrun.font.small_caps = False
+        p_f.left_indent = Inches(int(indent) * self.d['parameters']['cascade_indent'])
+        thisrun.font.name = style['Font']
+        thisrun.font.size = Pt(style['Size'])
+        c = style['Color']
+        thisrun.font.color.rgb = RGBColor(c, c, c)
+        thisrun.font.bold = style['Bold']
+        thisrun.font.underline = style['Underline']
+        p_f.space_after = Pt(self.d['parameters']['vertical_spacing'])
+
+    @profiled
     def read_esp_data(self, data_file):
         """
         Read JSON data into a dict.
@@ -93,6 +130,7 @@ class EspApp:
         with open(data_file, 'r') as f:
             return json.load(f)
 
+    @profiled
     def write_esp_data(self, data_file):
         """
         Output modified dict data into JSON file.
@@ -103,5 +141,6 @@ class EspApp:
             json.dump(self.d, f, indent=4, sort_keys=True)
 
 
-A = EspApp('esp_resume_data.json', 'esp_resume_data.json')
-A.run()
+if __name__ == '__main__':
+    A = EspApp('esp_resume_data.json', 'esp_resume_data.json')
+    A.run()
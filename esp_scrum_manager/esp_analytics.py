@@ -0,0 +1,379 @@
+"""
+ESP Scrum Manager - Analytics
+Cycle time, throughput, status dwell time and burndown over the history in self.d['log'].
+
+The log is parsed once into columnar NumPy arrays (one row per log entry); every metric is then
+computed with array operations, so multi-year logs with millions of entries stay fast.
+"""
+
+import re
+import numpy as np  # pip install numpy
+
+
+STATUSES = ['TODO', 'IN PROGRESS', 'REVIEW', 'BLOCKED', 'COMPLETE']
+TODO = 0
+COMPLETE = 4
+DELETED = -2  # Timeline status of a deleted task
+UNKNOWN = -1
+
+OPS = ['Added', 'Deleted', 'Updated']
+ADDED = 0
+DELETED_OP = 1
+UPDATED = 2
+
+DAY = 86400
+WEEK = 7 * DAY
+MONDAY = 3 * DAY  # 1970-01-01 was a Thursday; shifting by 3 days starts weeks on Monday
+
+# Added/Deleted/Updated entries written by EspApp, ex. -
+# 'Updated projects.cbdC90.storys.H6qTJg.tasks.rOodS0.status to Complete at 2021_07_23_21_21_41'
+LOG_PATTERN = re.compile(r'^(Added|Deleted|Updated) (?:Project |Story |Task )?'
+                         r'projects\.(\w+)(?:\.storys\.(\w+)(?:\.tasks\.(\w+))?)?(?:\.(\w+))?'
+                         r'(?: to (.*?))? at (\d{4}_\d\d_\d\d_\d\d_\d\d_\d\d)$', re.M)
+
+
+def parse_times(stamps):
+    """
+    Convert '%Y_%m_%d_%H_%M_%S' strings to epoch seconds without a Python loop.
+
+    Stamps of the wrong length (ex. - edited by hand) are marked invalid up front. If a stamp of
+    the right length is still not a date, the stamps are checked one by one to find it.
+
+    :param stamps: Timestamps (str sequence)
+    :return: Epoch seconds, 0 where invalid, and which stamps were valid (int64 array, bool array)
+    """
+    n = len(stamps)
+    ok = np.fromiter(map(len, stamps), dtype=np.int64, count=n) == 19
+    times = np.zeros(n, dtype=np.int64)
+    if not ok.any():
+        return times, ok
+    good = stamps if ok.all() else [k for k, v in zip(stamps, ok) if v]
+    a = np.frombuffer(''.join(good).encode('ascii', 'replace'), dtype=np.uint8).reshape(-1, 19).copy()
+    a[:, [4, 7]] = ord('-')
+    a[:, 10] = ord('T')
+    a[:, [13, 16]] = ord(':')
+    a = a.view('S19').ravel()
+    try:
+        times[ok] = a.astype('datetime64[s]').astype(np.int64)
+    except ValueError:
+        for i, k in zip(np.flatnonzero(ok), a):
+            try:
+                times[i] = np.datetime64(k.decode('ascii'), 's').astype(np.int64)
+            except ValueError:
+                ok[i] = False
+    return times, ok
+
+
+def encode(values, labels):
+    """
+    Map strings to codes by position in labels, comparing upper case. Each distinct value is looked up once.
+
+    :param values: Strings to encode (str list)
+    :param labels: Known labels (str list)
+    :return: Codes, UNKNOWN where not in labels (int8 array)
+    """
+    lookup = {k: labels.index(k.upper()) if k.upper() in labels else UNKNOWN for k in set(values)}
+    return np.fromiter(map(lookup.__getitem__, values), dtype=np.int8, count=len(values))
+
+
+def index(values, ids):
+    """
+    Map strings to their position in a sorted id array; '' maps to -1.
+
+    :param values: Strings to map (str list)
+    :param ids: Sorted distinct ids (str array)
+    :return: Positions (int32 array)
+    """
+    lookup = dict(zip(ids.tolist(), range(len(ids))))
+    lookup[''] = -1
+    return np.fromiter(map(lookup.__getitem__, values), dtype=np.int32, count=len(values))
+
+
+class EspAnalytics:
+    """
+    Columnar view of a scrum board's history.
+
+    Log columns (one row per parsed log entry):
+        time: Epoch seconds (int64)
+        op: ADDED, DELETED_OP or UPDATED (int8)
+        kind: 0 project, 1 story, 2 task (int8)
+        project: Index into self.projects (int32)
+        task: Index into self.task_ids, -1 if not a task (int32)
+        status: New status code for task status updates, else UNKNOWN (int8)
+
+    Task timeline columns (self.tl_*, one row per task state, sorted by task then time) are built
+    from those, with the creation state, every status change and deletion of each task.
+    tl_logged marks the states the log shows a task entering; creation states are inferred.
+
+    Log entries and tasks with timestamps that can't be read are left out and counted in self.skipped.
+    """
+
+    def __init__(self, d, now=None):
+        """
+        Parse the log of an ESP scrum document.
+
+        Tasks in the document that the log does not mention (ex. - older boards with an empty log)
+        are added from their time_created and current status.
+
+        :param d: ESP scrum data (dict)
+        :param now: Epoch seconds where open states end, default the last time in the data (int)
+        """
+        self.parse(d, now)
+        self.grid = None
+
+    def parse(self, d, now):
+        """
+        Fill the log columns and the task timeline.
+
+        :param d: ESP scrum data (dict)
+        :param now: Epoch seconds where open states end, or None (int)
+        """
+        rows = LOG_PATTERN.findall('\n'.join(d['log']))
+        self.time, ok = parse_times([k[6] for k in rows])
+        if not ok.all():
+            rows = [k for k, v in zip(rows, ok) if v]
+            self.time = self.time[ok]
+        [ops, projects, storys, tasks, attributes, values, _] = [list(k) for k in zip(*rows)] or [[]] * 7
+
+        # Tasks still on the board: id, project, creation time and current status
+        doc_tasks = [(t, p, str(task.get('time_created', '')), str(task.get('status', ''))) for p in d['projects']
+                     for story in d['projects'][p]['storys'].values() for t, task in story['tasks'].items()]
+        [doc_ids, doc_projects, doc_times, doc_status] = [list(k) for k in zip(*doc_tasks)] or [[]] * 4
+        doc_times, doc_ok = parse_times(doc_times)
+        self.skipped = int((~ok).sum() + (~doc_ok).sum())
+        doc_status = encode(doc_status, STATUSES)
+        doc_status[doc_status == UNKNOWN] = TODO
+
+        self.projects = np.array(sorted(set(projects) | set(doc_projects)), dtype=str)
+        self.task_ids = np.array(sorted((set(tasks) | set(doc_ids)) - {''}), dtype=str)
+        n = len(rows)
+        self.op = encode(ops, [k.upper() for k in OPS])
+        self.project = index(projects, self.projects)
+        self.task = index(tasks, self.task_ids)
+        has_story = np.fromiter(map(bool, storys), dtype=bool, count=n)
+        self.kind = np.where(self.task >= 0, 2, np.where(has_story, 1, 0)).astype(np.int8)
+        is_status = (self.op == UPDATED) & (self.kind == 2) & (encode(attributes, ['STATUS']) == 0)
+        self.status = np.where(is_status, encode(values, STATUSES), UNKNOWN).astype(np.int8)
+
+        end = max([int(self.time.max()) if n else 0, int(doc_times.max()) if len(doc_times) else 0])
+        self.now = end if now is None else now
+        self.build_timeline(is_status, index(doc_ids, self.task_ids), index(doc_projects, self.projects),
+                            doc_times, doc_status, doc_ok)
+
+    def build_timeline(self, is_status, doc_task, doc_project, doc_times, doc_status, doc_ok):
+        """
+        Build the per-task state timeline from the log columns and the tasks on the board.
+
+        :param is_status: Log rows that are task status updates (bool array)
+        :param doc_task: Task index of each task on the board (int array)
+        :param doc_project: Project index of each task on the board (int array)
+        :param doc_times: Creation time of each task on the board (int64 array)
+        :param doc_status: Current status code of each task on the board (int8 array)
+        :param doc_ok: Tasks on the board with a valid creation time (bool array)
+        """
+        n_tasks = len(self.task_ids)
+        current = np.full(n_tasks, TODO, dtype=np.int8)
+        current[doc_task] = doc_status
+        updated = np.zeros(n_tasks, dtype=bool)
+        updated[self.task[is_status]] = True
+        is_task = self.kind == 2
+        adds = is_task & (self.op == ADDED)
+        logged = np.zeros(n_tasks, dtype=bool)
+        logged[self.task[adds]] = True
+
+        # Tasks without an update were created in their current status; otherwise assume To Do.
+        add_task = self.task[adds]
+        add_status = np.where(updated[add_task], TODO, current[add_task])
+        missing = ~logged[doc_task] & doc_ok
+        doc_status = np.where(updated[doc_task], TODO, doc_status)
+        changes = is_task & ((self.op == DELETED_OP) | is_status)
+        parts = [
+            (doc_times[missing], doc_task[missing], doc_project[missing], doc_status[missing]),
+            (self.time[adds], add_task, self.project[adds], add_status),
+            (self.time[changes], self.task[changes], self.project[changes],
+             np.where(self.op[changes] == DELETED_OP, DELETED, self.status[changes])),
+        ]
+        t = np.concatenate([k[0] for k in parts]).astype(np.int64)
+        task = np.concatenate([k[1] for k in parts]).astype(np.int32)
+        project = np.concatenate([k[2] for k in parts]).astype(np.int32)
+        status = np.concatenate([k[3] for k in parts]).astype(np.int8)
+        logged = np.repeat([False, False, True], [len(k[0]) for k in parts])
+        order = np.lexsort((np.arange(len(t)), t, task))  # By task, then time, then log order
+        self.tl_time = t[order]
+        self.tl_task = task[order]
+        self.tl_project = project[order]
+        self.tl_status = status[order]
+        self.tl_logged = logged[order]
+        self.tl_first = np.r_[True, self.tl_task[1:] != self.tl_task[:-1]] if len(t) else np.zeros(0, dtype=bool)
+
+    # Metrics
+    def cycle_times(self):
+        """
+        Time from creation to first completion of every completed task.
+
+        Only logged status updates to Complete count. Tasks that were created Complete, or whose
+        history is missing from the log, have no measured cycle and are left out.
+
+        :return: Task indexes and cycle times in days (int32 array, float64 array)
+        """
+        created = np.zeros(len(self.task_ids), dtype=np.int64)
+        created[self.tl_task[self.tl_first]] = self.tl_time[self.tl_first]
+        done = (self.tl_status == COMPLETE) & self.tl_logged
+        tasks, first = np.unique(self.tl_task[done], return_index=True)
+        return tasks, (self.tl_time[done][first] - created[tasks]) / DAY
+
+    def throughput(self):
+        """
+        Number of tasks first completed in each week, Monday to Sunday, counting logged updates
+        to Complete only (see cycle_times).
+
+        :return: Week start times in epoch seconds and completions (int64 array, int64 array)
+        """
+        done = (self.tl_status == COMPLETE) & self.tl_logged
+        tasks, first = np.unique(self.tl_task[done], return_index=True)
+        weeks = (self.tl_time[done][first] + MONDAY) // WEEK
+        if len(weeks) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        counts = np.bincount(weeks - weeks.min())
+        return (np.arange(weeks.min(), weeks.max() + 1) * WEEK - MONDAY), counts
+
+    def dwell_times(self):
+        """
+        Mean and total time tasks spent in each status. Open states end at self.now.
+
+        :return: Mean days and total days per status, in STATUSES order (float64 array, float64 array)
+        """
+        end = np.r_[self.tl_time[1:], self.now] if len(self.tl_time) else self.tl_time
+        last = np.r_[self.tl_first[1:], True] if len(self.tl_time) else self.tl_first
+        end = np.where(last, self.now, end)
+        valid = self.tl_status >= 0
+        days = (end[valid] - self.tl_time[valid]) / DAY
+        totals = np.bincount(self.tl_status[valid], weights=days, minlength=len(STATUSES))
+        counts = np.bincount(self.tl_status[valid], minlength=len(STATUSES))
+        return np.divide(totals, counts, out=np.zeros(len(STATUSES)), where=counts > 0), totals
+
+    def burndown_grid(self):
+        """
+        Open (not complete, not deleted) tasks per project at the end of each day, computed once.
+
+        :return: Day start times in epoch seconds and open tasks (int64 array, int64 array [project, day])
+        """
+        if self.grid is None:
+            n_projects = len(self.projects)
+            if len(self.tl_time) == 0:
+                self.grid = (np.zeros(0, dtype=np.int64), np.zeros((n_projects, 0), dtype=np.int64))
+                return self.grid
+            is_open = ((self.tl_status != COMPLETE) & (self.tl_status != DELETED)).astype(np.int64)
+            was_open = np.where(self.tl_first, 0, np.r_[0, is_open[:-1]])
+            day0 = self.tl_time.min() // DAY
+            day = self.tl_time // DAY - day0
+            n_days = int(max(day.max(), self.now // DAY - day0)) + 1
+            delta = np.bincount(self.tl_project.astype(np.int64) * n_days + day, weights=is_open - was_open,
+                                minlength=n_projects * n_days)
+            self.grid = ((np.arange(n_days) + day0) * DAY,
+                         np.cumsum(delta.reshape(n_projects, n_days), axis=1).round().astype(np.int64))
+        return self.grid
+
+    def burndown(self, project=None):
+        """
+        Open tasks at the end of each day for one project, or the whole board.
+
+        :param project: Project id or dot path, default all projects (str)
+        :return: Day start times in epoch seconds and open tasks (int64 array, int64 array)
+        """
+        days, grid = self.burndown_grid()
+        if project is None:
+            return days, grid.sum(axis=0)
+        i = np.searchsorted(self.projects, project.split('.')[-1])
+        if i == len(self.projects) or self.projects[i] != project.split('.')[-1]:
+            return days, np.zeros(len(days), dtype=np.int64)
+        return days, grid[i]
+
+    # Output
+    def summary(self, d, weeks=8):
+        """
+        Collect the headline numbers for the console and Excel.
+
+        :param d: ESP scrum data, for project names (dict)
+        :param weeks: Number of recent weeks to show (int)
+        :return: Labelled results (dict)
+        """
+        tasks, cycle = self.cycle_times()
+        mean_dwell, _ = self.dwell_times()
+        week_starts, completions = self.throughput()
+        days, grid = self.burndown_grid()
+        week_ends = np.searchsorted(days, np.arange(self.now - (weeks - 1) * WEEK, self.now + 1, WEEK), side='right') - 1
+        week_ends = week_ends[week_ends >= 0]
+        names = {k: d['projects'][k]['text'] for k in d['projects']}
+        stats = [['Tasks', int(self.tl_first.sum())], ['Completed', len(tasks)]]
+        if self.skipped:
+            stats.append(['Skipped, bad timestamp', self.skipped])
+        if len(cycle):
+            stats += [['Mean cycle days', round(float(cycle.mean()), 2)],
+                      ['Median cycle days', round(float(np.median(cycle)), 2)],
+                      ['85th percentile cycle days', round(float(np.percentile(cycle, 85)), 2)]]
+        return {
+            'stats': stats,
+            'dwell': [[STATUSES[k], round(float(mean_dwell[k]), 2)] for k in range(len(STATUSES))],
+            'throughput': [[str(np.datetime64(int(k), 's').astype('datetime64[D]')), int(n)]
+                           for k, n in zip(week_starts[-weeks:], completions[-weeks:])],
+            'burndown_dates': [str(np.datetime64(int(days[k]), 's').astype('datetime64[D]')) for k in week_ends],
+            'burndown': [[names.get(p, p)] + [int(grid[i][k]) for k in week_ends]
+                         for i, p in enumerate(self.projects) if p in names],
+        }
+
+    def print_summary(self, d, weeks=8):
+        """
+        Print the summary into console.
+
+        :param d: ESP scrum data (dict)
+        :param weeks: Number of recent weeks to show (int)
+        """
+        s = self.summary(d, weeks)
+        for title, rows in [('Tasks', s['stats']), ('Mean days in status', s['dwell']),
+                            ('Completed per week', s['throughput'])]:
+            print('')
+            print(title)
+            print('-' * len(title))
+            for [label, value] in rows:
+                print(str(label).ljust(30) + str(value))
+        print('')
+        print('Open tasks at end of week')
+        print('-' * 25)
+        width = max([len(k[0]) for k in s['burndown']] + [7])
+        print('Project'.ljust(width + 2) + ''.join(k[5:].rjust(7) for k in s['burndown_dates']))
+        for row in s['burndown']:
+            print(row[0].ljust(width + 2) + ''.join(str(k).rjust(7) for k in row[1:]))
+
+    def write_excel_sheet(self, wb, d, weeks=52):
+        """
+        Add an 'Analytics' sheet with the summary, full weekly throughput and weekly burndown.
+
+        :param wb: Workbook to add the sheet to (openpyxl.Workbook)
+        :param d: ESP scrum data, for project names and excel_fmt (dict)
+        :param weeks: Number of recent weeks in the burndown table (int)
+        :return: The new sheet (openpyxl.worksheet.worksheet.Worksheet)
+        """
+        from openpyxl.styles import Font
+
+        s = self.summary(d, weeks)
+        week_starts, completions = self.throughput()
+        s['throughput'] = [[str(np.datetime64(int(k), 's').astype('datetime64[D]')), int(n)]
+                           for k, n in zip(week_starts, completions)]
+        exf = d['excel_fmt']
+        titlefont = Font(name=exf['HeaderFont'], size=int(exf['HeaderFontSize']), bold=True)
+        ws = wb.create_sheet('Analytics')
+        row = 1
+        for title, header, rows in [('Tasks', ['', ''], s['stats']),
+                                    ('Mean days in status', ['Status', 'Days'], s['dwell']),
+                                    ('Open tasks at end of week', ['Project'] + s['burndown_dates'], s['burndown']),
+                                    ('Completed per week', ['Week of', 'Tasks'], s['throughput'])]:
+            ws.cell(row=row, column=1, value=title).font = titlefont
+            for c, value in enumerate(header):
+                ws.cell(row=row + 1, column=c + 1, value=value).font = Font(bold=True)
+            for r, values in enumerate(rows):
+                for c, value in enumerate(values):
+                    ws.cell(row=row + 2 + r, column=c + 1, value=value)
+            row += len(rows) + 3
+        ws.column_dimensions['A'].width = int(exf['StoriesWidth'])
+        return ws
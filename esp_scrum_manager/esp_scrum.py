@@ -5,14 +5,75 @@ Evan McKee
 """
 
 
+import os
+import sys
 import random
 import string
 import json
+import time
 from datetime import datetime
-from benedict import benedict  # pip install python-benedict
-from openpyxl import Workbook  # Remove if not printing to Excel
-from openpyxl.styles import PatternFill, Border, Side, Alignment, Font, NamedStyle
-from openpyxl.utils import get_column_letter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Shared esp_profiler.py
+try:
+    from esp_profiler import profiled, get_profiler
+except ImportError:  # App folder copied on its own: run without profiling
+    get_profiler = None
+
+    def profiled(method):
+        return method
+
+
+class EspDict(dict):
+    """
+    Dict that can also be indexed by dot notation (my_dict['a']['b'] == my_dict['a.b']).
+
+    Stands in for python-benedict, which imports every one of its serializers (openpyxl included)
+    as soon as it is loaded. Only keypath get, set, delete and membership are supported.
+    """
+
+    def __getitem__(self, key):
+        if isinstance(key, str) and '.' in key:
+            parent, key = self._get_parent(key)
+            return parent[key]
+        return dict.__getitem__(self, key)
+
+    def __setitem__(self, key, value):
+        if isinstance(key, str) and '.' in key:
+            parent, key = self._get_parent(key)
+            parent[key] = value
+        else:
+            dict.__setitem__(self, key, value)
+
+    def __delitem__(self, key):
+        if isinstance(key, str) and '.' in key:
+            parent, key = self._get_parent(key)
+            del parent[key]
+        else:
+            dict.__delitem__(self, key)
+
+    def __contains__(self, key):
+        try:
+            self[key]
+        except (KeyError, TypeError):
+            return False
+        return True
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def _get_parent(self, keypath):
+        """
+        Walk a dot path down to the dict holding its last key.
+
+        :param keypath: Dot path to a resource ex. - 'projects.cbdC90.text' (str)
+        :return: Parent dict and last key (tuple)
+        """
+        keys = keypath.split('.')
+        parent = dict.__getitem__(self, keys[0])
+        for k in keys[1:-1]:
+            parent = parent[k]
+        return parent, keys[-1]
+
 
 class EspApp:
     """
@@ -40,7 +101,14 @@ class EspApp:
         :param output_file: Path to JSON file to write (str)
         """
 
+        self.profiler = None
+        start = time.perf_counter()
         self.d = self.read_esp_data(esp_data)
+        if self.d.get('profiling', {}).get('enabled', False) and get_profiler is not None:
+            self.profiler = get_profiler(self.d['profiling'])
+            self.profiler.record('read_esp_data', time.perf_counter() - start)
+        if 'excel_export' not in self.d:
+            self.d['excel_export'] = {'file': '', 'sheets': {}, 'changed': [], 'all_projects': True}
 
         self.active_project = ''
         self.active_story = ''
@@ -166,17 +234,18 @@ class EspApp:
         self.write_esp_data(self.output_file)
 
     # Input Methods
+    @profiled
     def read_esp_data(self, data_file):
         """
         Read JSON data into a dict.
 
-        Note: python-benedict allows dict indexing by dot notation (my_dict['a']['b'] == my_dict['a.b'].
+        Note: EspDict allows dict indexing by dot notation (my_dict['a']['b'] == my_dict['a.b']).
         While not required, is useful for managing nested dicts called dynamically.
 
         :param data_file: Path to JSON file (str)
         """
         with open(data_file, 'r') as f:
-            return benedict(json.load(f))
+            return EspDict(json.load(f))
 
     def read_resource_loader(self, txt_file):
         """
@@ -208,7 +277,7 @@ class EspApp:
                         status = 'TODO'
                     if line.startswith(':'):
                         task = self.get_task(line.replace(':', ''))
-                        self.d[task]['status'] = status
+                        self.update_attribute(task, 'status', status)
                     else:
                         self.add_task(project, story, line, status)
                 # Stories
@@ -266,12 +335,15 @@ class EspApp:
                 self.active_attributes = ['text', 'status', 'notes']
             self.window_chain = ['update_attribute', 'home']
         elif function == 'update_attribute':
-            self.d[self.active_resource + '.' + self.selected_attribute] = self.input_text
-            time = datetime.now().strftime(self.time_format)
-            self.d['log'].append('Updated ' + self.active_resource + '.' + self.selected_attribute + ' to '
-                                 + self.input_text + ' at ' + time)
+            self.update_attribute(self.active_resource, self.selected_attribute, self.input_text)
         elif function == 'print_to_excel':
             self.print_to_excel(self.d['project_paths'], 'SCRUM.xlsx')
+        elif function == 'refresh_excel':
+            self.refresh_excel('SCRUM.xlsx')
+        elif function == 'print_analytics':
+            self.get_analytics().print_summary(self.d)
+        elif function == 'analytics_to_excel':
+            self.analytics_to_excel('ANALYTICS.xlsx')
         elif function == 'read_from_text':
             print('Text file? (Include extension)')
             x = input()
@@ -375,6 +447,7 @@ class EspApp:
         print('Error: text ' + text + ' not found.')
         return ''
 
+    @profiled
     def add_project(self, text):
         """
         Add project resource.
@@ -389,11 +462,11 @@ class EspApp:
             'storys': {},
             'time_created': time_created
         }
-        self.d['project_paths'].insert(0, '.'.join(['projects', name]))
-        self.d['resources'].insert(0, name)
+        self.add_to_index('project_paths', '.'.join(['projects', name]))
         self.add_story('.'.join(['projects', name]), 'Backlog')
         self.d['log'].append('Added Project ' + '.'.join(['projects', name]) + ' at ' + time_created)
 
+    @profiled
     def add_story(self, project, text):
         """
         Add story resource.
@@ -411,11 +484,11 @@ class EspApp:
             'tasks': {},
             'time_created': time_created
         }
-        self.d['resources'].insert(0, name)
-        self.d['storys'].insert(0, '.'.join(['projects', project, 'storys', name]))
+        self.add_to_index('storys', '.'.join(['projects', project, 'storys', name]))
         self.d['log'].append(
             'Added Story ' + '.'.join(['projects', project, 'storys', name]) + ' at ' + time_created)
 
+    @profiled
     def add_task(self, project, story, text, status='todo'):
         """
         Add task resource.
@@ -438,55 +511,41 @@ class EspApp:
             'time_created': time_created,
             'notes': ''
         }
-        self.d['resources'].insert(0, name)
-        self.d['tasks'].insert(0, '.'.join(['projects', project, 'storys', story, 'tasks', name]))
+        self.add_to_index('tasks', '.'.join(['projects', project, 'storys', story, 'tasks', name]))
         self.d['log'].append('Added Task ' + '.'.join(['projects', project, 'storys', story, 'tasks', name]) +
                              ' at ' + time_created)
 
+    @profiled
     def del_project(self, project_id):
         """
         Remove project resource and children.
 
         :param project_id: Project dot path (str)
         """
-        project_story_names = self.d[project_id]['storys']
-        project_task_names = []
-        for k in project_story_names:
-            project_task_names.extend(self.d[project_id]['storys'][k]['tasks'])
-        project_task_paths = []
-        for k in project_task_names:
-            project_task_paths.append([j for j in self.d['tasks'] if k in j][0])
-        project_story_paths = []
-        for k in project_story_names:
-            project_story_paths.append([j for j in self.d['storys'] if k in j][0])
-        for k in project_task_paths:
-            self.del_task(k)
+        project_story_paths = [project_id + '.storys.' + k for k in self.d[project_id]['storys']]
         for k in project_story_paths:
             self.del_story(k)
         del self.d[project_id]
-        self.d['project_paths'].remove(project_id)
-        self.d['resources'].remove(project_id.split('.')[-1])
+        self.remove_from_index('project_paths', project_id)
         time_deleted = datetime.now().strftime(self.time_format)
         self.d['log'].append('Deleted Project ' + project_id + ' at ' + time_deleted)
 
+    @profiled
     def del_story(self, full_story_id):
         """
         Remove story resource and children.
 
         :param full_story_id: story dot path (str)
         """
-        story_task_names = self.d[full_story_id]['tasks']
-        story_task_paths = []
-        for k in story_task_names:
-            story_task_paths.append([j for j in self.d['tasks'] if k in j][0])
+        story_task_paths = [full_story_id + '.tasks.' + k for k in self.d[full_story_id]['tasks']]
         for k in story_task_paths:
             self.del_task(k)
         del self.d[full_story_id]
-        self.d['storys'].remove(full_story_id)
-        self.d['resources'].remove(full_story_id.split('.')[-1])
+        self.remove_from_index('storys', full_story_id)
         time_deleted = datetime.now().strftime(self.time_format)
         self.d['log'].append('Deleted Story ' + full_story_id + ' at ' + time_deleted)
 
+    @profiled
     def del_task(self, full_task_id):
         """
         Remove task resource.
@@ -494,11 +553,66 @@ class EspApp:
         :param full_task_id: Task dot path (str)
         """
         del self.d[full_task_id]
-        self.d['tasks'].remove(full_task_id)
-        self.d['resources'].remove(full_task_id.split('.')[-1])
+        self.remove_from_index('tasks', full_task_id)
         time_deleted = datetime.now().strftime(self.time_format)
         self.d['log'].append('Deleted Task ' + full_task_id + ' at ' + time_deleted)
 
+    @profiled
+    def update_attribute(self, resource, attribute, value):
+        """
+        Set one attribute of a resource.
+
+        :param resource: Resource dot path (str)
+        :param attribute: Attribute name ex. - 'status' (str)
+        :param value: New value (str)
+        """
+        self.d[resource + '.' + attribute] = value
+        self.mark_changed(resource)
+        time = datetime.now().strftime(self.time_format)
+        self.d['log'].append('Updated ' + resource + '.' + attribute + ' to ' + value + ' at ' + time)
+
+    def add_to_index(self, index, path):
+        """
+        Register a new resource in a flat index list and in self.d['resources'].
+
+        :param index: Index key ex. - 'tasks' (str)
+        :param path: Resource dot path (str)
+        """
+        self.d[index].insert(0, path)
+        self.d['resources'].insert(0, path.split('.')[-1])
+        self.mark_changed(path)
+
+    def remove_from_index(self, index, path):
+        """
+        Remove a deleted resource from a flat index list and from self.d['resources'].
+
+        :param index: Index key ex. - 'tasks' (str)
+        :param path: Resource dot path (str)
+        """
+        self.d[index].remove(path)
+        self.d['resources'].remove(path.split('.')[-1])
+        self.mark_changed(path)
+
+    def mark_changed(self, path):
+        """
+        Record that a project changed since the last Excel export, for refresh_excel.
+
+        :param path: Dot path of the changed resource (str)
+        """
+        project = '.'.join(path.split('.')[:2])
+        if project not in self.d['excel_export']['changed']:
+            self.d['excel_export']['changed'].append(project)
+
+    def take_changed(self):
+        """
+        Get and clear the projects changed since the last Excel export.
+
+        :return: Project paths (str list)
+        """
+        changed = self.d['excel_export']['changed']
+        self.d['excel_export']['changed'] = []
+        return changed
+
     # Output Methods
     def print_menu(self, option_list, exitnum):
         """
@@ -526,6 +640,7 @@ class EspApp:
                 print(row)
             print('')
 
+    @profiled
     def print_to_excel(self, target_projects, filename):
         """
         Print scrum board into Excel, one project per sheet.
@@ -533,8 +648,91 @@ class EspApp:
         :param filename: .xlsx filename (str)
         :param target_projects: Project paths to be included in board (str list)
         """
+        # Imported here so console-only sessions don't pay for openpyxl at startup.
+        from openpyxl import Workbook
+
+        self.take_changed()
+        exp = self.d['excel_export']
+        exp['file'] = ''  # Set again once saved, so a failed export forces a full one next time.
+        exp['sheets'] = {}
+        exp['all_projects'] = all(k in target_projects for k in self.d['project_paths'])
         wb = Workbook()
-        ws = wb.worksheets[0]
+        for k in target_projects:
+            exp['sheets'][k] = self.write_excel_sheet(wb, k).title
+        del wb['Sheet']
+        wb.save(filename)
+        exp['file'] = filename
+
+    @profiled
+    def refresh_excel(self, filename):
+        """
+        Update a board written by print_to_excel, rewriting only the sheets of projects that changed
+        since the last export. Sheets of unchanged projects are left untouched.
+
+        The board keeps the projects of the last export: if every project was exported, projects
+        added since get a sheet too; if only some were, only those are refreshed.
+
+        Note: Only changes made through the add, del and update methods are tracked. After editing
+        the JSON file by hand or changing excel_fmt, use print_to_excel.
+
+        :param filename: .xlsx filename (str)
+        """
+        from openpyxl import load_workbook
+
+        exp = self.d['excel_export']
+        if exp['file'] != filename:
+            self.print_to_excel(self.d['project_paths'], filename)
+            return
+        if exp.get('all_projects', True):
+            targets = self.d['project_paths']
+        else:
+            targets = [k for k in self.d['project_paths'] if k in exp['sheets']]
+        if not os.path.exists(filename):
+            self.print_to_excel(targets, filename)
+            return
+        changed = self.take_changed()
+        stale = [k for k in exp['sheets'] if k in changed or k not in self.d['project_paths']]
+        missing = [k for k in targets if k not in exp['sheets'] or k in stale]
+        if stale == [] and missing == []:
+            return
+        exp['file'] = ''
+        wb = load_workbook(filename)
+        for k in stale:
+            if exp['sheets'][k] in wb.sheetnames:
+                del wb[exp['sheets'][k]]
+            del exp['sheets'][k]
+        for i, k in enumerate(targets):
+            if k in missing:
+                exp['sheets'][k] = self.write_excel_sheet(wb, k, i).title
+        wb.save(filename)
+        exp['file'] = filename
+
+    @profiled
+    def analytics_to_excel(self, filename):
+        """
+        Print cycle time, dwell time, throughput and burndown into Excel (see esp_analytics.py).
+
+        :param filename: .xlsx filename (str)
+        """
+        from openpyxl import Workbook
+
+        wb = Workbook()
+        self.get_analytics().write_excel_sheet(wb, self.d)
+        del wb['Sheet']
+        wb.save(filename)
+
+    def write_excel_sheet(self, wb, target_project, index=None):
+        """
+        Add one project's scrum board to a workbook as a new sheet.
+
+        :param wb: Workbook to add the sheet to (openpyxl.Workbook)
+        :param target_project: Project path (str)
+        :param index: Optional sheet position, default last (int)
+        :return: The new sheet (openpyxl.worksheet.worksheet.Worksheet)
+        """
+        from openpyxl.styles import PatternFill, Border, Side, Alignment, Font, NamedStyle
+        from openpyxl.utils import get_column_letter
+
         corner = [1, 1]
         exf = self.d['excel_fmt']
         titlefont = Font(
@@ -556,52 +754,52 @@ class EspApp:
             horizontal='center',
             vertical='bottom',
             wrap_text=True)
-        bd = Side(style='thick', color='000000')
-        postit = NamedStyle(name='postit')
-        postit.border = Border(right=bd, bottom=bd)
-        for k in target_projects:
-            table = self.get_project_table(k)
-            projectname = table[0][0]
-            wb.create_sheet(projectname[0:30])
-            ws = wb[projectname[0:30]]
-            for r in range(0, len(table)):
-                for c in range(0, len(table[0])):
-                    cell = ws.cell(row = (corner[1] + r)*2, column = (corner[0] + c)*2)
-                    cell.value = table[r][c]
-                    cell.alignment = alignment
-                    if [r, c] == [0, 0]:
-                        thisfont = titlefont
-                    elif r == 1:
-                        thisfont = headerfont
-                    else:
-                        thisfont = textfont
+        if 'postit' not in wb.named_styles:  # Reuse the style of a workbook opened by refresh_excel
+            bd = Side(style='thick', color='000000')
+            postit = NamedStyle(name='postit')
+            postit.border = Border(right=bd, bottom=bd)
+            wb.add_named_style(postit)
+        table = self.get_project_table(target_project)
+        projectname = table[0][0]
+        ws = wb.create_sheet(projectname[0:30], index)
+        for r in range(0, len(table)):
+            for c in range(0, len(table[0])):
+                cell = ws.cell(row = (corner[1] + r)*2, column = (corner[0] + c)*2)
+                cell.value = table[r][c]
+                cell.alignment = alignment
+                if [r, c] == [0, 0]:
+                    thisfont = titlefont
+                elif r == 1:
+                    thisfont = headerfont
+                else:
+                    thisfont = textfont
+                if c == 0:
+                    ws.column_dimensions[get_column_letter((corner[0] + c)*2)].width = exf['StoriesWidth']
+                    ws.column_dimensions[get_column_letter((corner[0] + c)*2+1)].width = exf['GapWidth']
+                else:
+                    ws.column_dimensions[get_column_letter((corner[0] + c)*2)].width = exf['ColumnWidth']
+                    ws.column_dimensions[get_column_letter((corner[0] + c)*2+1)].width = exf['GapWidth']
+                ws.row_dimensions[(corner[1] + r)*2].height = exf['RowHeight']
+                ws.row_dimensions[(corner[1] + r)*2+1].height = exf['GapHeight']
+                if cell.value != "":
+                    cell.style = 'postit'
+                    cell.font = thisfont
+                    cell.alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
                     if c == 0:
-                        ws.column_dimensions[get_column_letter((corner[0] + c)*2)].width = exf['StoriesWidth']
-                        ws.column_dimensions[get_column_letter((corner[0] + c)*2+1)].width = exf['GapWidth']
-                    else:
-                        ws.column_dimensions[get_column_letter((corner[0] + c)*2)].width = exf['ColumnWidth']
-                        ws.column_dimensions[get_column_letter((corner[0] + c)*2+1)].width = exf['GapWidth']
-                    ws.row_dimensions[(corner[1] + r)*2].height = exf['RowHeight']
-                    ws.row_dimensions[(corner[1] + r)*2+1].height = exf['GapHeight']
-                    if cell.value != "":
-                        cell.style = postit
-                        cell.font = thisfont
-                        cell.alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
-                        if c == 0:
-                            cell.fill = PatternFill('solid', fgColor=exf['StoriesColor'])
-                        elif c == 1:
-                            cell.fill = PatternFill('solid', fgColor=exf['ToDoColor'])
-                        elif c == 2:
-                            cell.fill = PatternFill('solid', fgColor=exf['InProgressColor'])
-                        elif c == 3:
-                            cell.fill = PatternFill('solid', fgColor=exf['ReviewColor'])
-                        elif c == 4:
-                            cell.fill = PatternFill('solid', fgColor=exf['BlockedColor'])
-                        elif c == 5:
-                            cell.fill = PatternFill('solid', fgColor=exf['CompleteColor'])
-        del wb['Sheet']
-        wb.save(filename)
-
+                        cell.fill = PatternFill('solid', fgColor=exf['StoriesColor'])
+                    elif c == 1:
+                        cell.fill = PatternFill('solid', fgColor=exf['ToDoColor'])
+                    elif c == 2:
+                        cell.fill = PatternFill('solid', fgColor=exf['InProgressColor'])
+                    elif c == 3:
+                        cell.fill = PatternFill('solid', fgColor=exf['ReviewColor'])
+                    elif c == 4:
+                        cell.fill = PatternFill('solid', fgColor=exf['BlockedColor'])
+                    elif c == 5:
+                        cell.fill = PatternFill('solid', fgColor=exf['CompleteColor'])
+        return ws
+
+    @profiled
     def get_project_table(self, target_project):
         """
         Format a project into a scrum table for use in print_scrum_board and print_to_excel
@@ -630,16 +828,41 @@ class EspApp:
                 table.append([str(j[n]) for j in [story_col, todo, inprogress, inreview, blocked, complete]])
         return table      
 
+    @profiled
+    def get_analytics(self):
+        """
+        Parse the log into columnar arrays for time-series analytics (see esp_analytics.py).
+
+        :return: Analytics over this board's history, with open states ending now (EspAnalytics)
+        """
+        # Imported here so numpy only loads when analytics are asked for.
+        from calendar import timegm
+        from esp_analytics import EspAnalytics
+
+        return EspAnalytics(self.d, timegm(datetime.now().timetuple()))  # Log times are local, like now
+
+    @profiled
     def write_esp_data(self, data_file):
         """
         Output modified dict data into JSON file.
 
+        Note: Every save bumps self.d['version'], so SharedEspApp can tell the file was saved
+        by someone else after it was loaded.
+
         :param data_file: Target json file (str)
         """
-        with open(data_file, 'w') as f:
-            d = dict(self.d)  # Un-benedict the dict
-            json.dump(d, f, indent=4, sort_keys=True)
-
-
-A = EspApp('esp_scrum_data.json', 'esp_scrum_data.json')  # Input, output json files.
-A.run()
+        version = self.d.get('version', 0)
+        self.d['version'] = version + 1
+        try:
+            with open(data_file, 'w') as f:
+                d = dict(self.d)  # Back to a plain dict
+                json.dump(d, f, indent=4, sort_keys=True)
+        except Exception:
+            self.d['version'] = version
+            raise
+
+
+if __name__ == '__main__':
+    # Saved with the version check, so other people's changes to the file are never overwritten.
+    from esp_shared import run_checked
+    run_checked('esp_scrum_data.json', 'esp_scrum_data.json')  # Input, output json files.
@@ -0,0 +1,410 @@
+"""
+ESP Scrum Manager - HTTP Service
+Serve one in-memory scrum document as JSON over HTTP, using asyncio and the standard library only.
+
+Routes (stories are 'stories' in URLs, 'storys' in the JSON file):
+    GET    /projects                                    List projects
+    POST   /projects                                    Add project {"text": ...}
+    GET    /projects/<p>[/stories/<s>[/tasks/<t>]]      Read a resource
+    PATCH  /projects/<p>[/stories/<s>[/tasks/<t>]]      Update attributes {"status": ..., ...}
+    DELETE /projects/<p>[/stories/<s>[/tasks/<t>]]      Remove a resource and its children
+    POST   /projects/<p>/stories                        Add story {"text": ...}
+    POST   /projects/<p>/stories/<s>/tasks              Add task {"text": ..., "status": ...}
+    GET    /projects/<p>/table                          Scrum table from get_project_table
+    GET    /search?q=<text>                             Resources whose text contains <text>
+    POST   /export                                      Print to Excel {"filename": ..., "projects": [...]}
+                                                        or refresh the last export {"incremental": true}
+    POST   /reload                                      Drop unsaved changes and read the JSON file again
+
+Requests other than GET must be sent with 'Content-Type: application/json', so a web page can't
+post to the service without the browser asking first (CORS preflight, which is never granted).
+Export filenames are plain .xlsx names; the files are written next to the JSON file.
+
+Settings are read from the 'server' dict of the ESP JSON file.
+"""
+
+import os
+import json
+import asyncio
+from urllib.parse import urlsplit, parse_qs, unquote
+from esp_scrum import EspApp
+from esp_shared import SharedEspApp, VersionConflictError
+
+
+class HttpError(Exception):
+    """
+    Error returned to the client as {"error": message} with an HTTP status.
+    """
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class EspServer:
+    """
+    Asyncio HTTP/JSON front end for a SharedEspApp.
+
+    All requests share one document. Mutations mark it dirty and are saved in one batch
+    with write_esp_data, flush_delay seconds after the first unsaved change. Rendered project
+    tables are cached per project and dropped whenever that project changes.
+
+    If someone else saved the file since it was loaded, the save fails with a version conflict.
+    The changes stay in memory, but mutations get 409 Conflict until POST /reload.
+    While a reload runs, mutations get 503 Service Unavailable.
+    """
+
+    reasons = {200: 'OK', 201: 'Created', 400: 'Bad Request', 404: 'Not Found',
+               405: 'Method Not Allowed', 409: 'Conflict', 415: 'Unsupported Media Type',
+               500: 'Internal Server Error', 503: 'Service Unavailable'}
+    attributes = {'project': ['text'], 'story': ['text'], 'task': ['text', 'status', 'notes']}
+    statuses = ['TODO', 'IN PROGRESS', 'REVIEW', 'BLOCKED', 'COMPLETE']  # Columns of get_project_table
+
+    def __init__(self, esp_data, output_file):
+        """
+        Load the document and read server settings.
+
+        :param esp_data: Path to JSON file to read (str)
+        :param output_file: Path to JSON file to write (str)
+        """
+        self.app = SharedEspApp(esp_data, output_file)
+        settings = self.app.d.get('server', {})
+        self.host = settings.get('host', '127.0.0.1')
+        self.port = int(settings.get('port', 8080))
+        self.flush_delay = float(settings.get('flush_delay', 1.0))
+        self.tables = {}
+        self.dirty = False
+        self.conflict = None  # VersionConflictError message while changes cannot be saved
+        self.reloading = False
+        self.export_lock = asyncio.Lock()  # One export at a time; they share excel_export and files
+        self.export_dir = os.path.dirname(os.path.abspath(output_file))
+        self.flush_handle = None
+        self.server = None
+
+    async def start(self):
+        """
+        Start listening. Use port 0 in settings to get a free port, stored back in self.port.
+        """
+        self.server = await asyncio.start_server(self.handle_connection, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        """
+        Stop listening and save any unsaved changes, to '<name>.conflict.json' after a conflict.
+        """
+        self.server.close()
+        await self.server.wait_closed()
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        await self.flush()
+        if self.conflict is not None and self.dirty:
+            conflict_file = os.path.splitext(self.app.output_file)[0] + '.conflict.json'
+            EspApp.write_esp_data(self.app, conflict_file)
+            print('Unsaved changes were written to ' + conflict_file + '.')
+
+    async def serve_forever(self):
+        await self.start()
+        print('Serving ' + self.app.esp_data + ' on http://' + self.host + ':' + str(self.port))
+        try:
+            await self.server.serve_forever()
+        finally:
+            await self.stop()
+
+    # Persistence
+    def mark_dirty(self, path):
+        """
+        Drop the cached table of a changed project and schedule a write-behind save.
+
+        :param path: Dot path of the changed resource (str)
+        """
+        self.tables.pop(path.split('.')[1], None)
+        self.dirty = True
+        if self.flush_handle is None:
+            loop = asyncio.get_running_loop()
+            self.flush_handle = loop.call_later(self.flush_delay, lambda: loop.create_task(self.flush()))
+
+    async def flush(self):
+        """
+        Save the document if it has unsaved changes, off the event loop.
+        """
+        self.flush_handle = None
+        if not self.dirty or self.conflict is not None:
+            return
+        self.dirty = False
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, self.app.write_esp_data, self.app.output_file)
+        except VersionConflictError as e:
+            self.dirty = True
+            self.conflict = str(e)
+            print('Error: ' + str(e) + ' Not saved; changes are refused until POST /reload.')
+        except OSError as e:
+            self.dirty = True
+            print('Error: could not save ' + self.app.output_file + ': ' + str(e))
+
+    async def reload(self):
+        """
+        Drop unsaved changes and cached tables and read the JSON file again, ending a conflict.
+
+        :return: Version of the reloaded document (dict)
+        """
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        self.reloading = True
+        try:
+            loop = asyncio.get_running_loop()
+            async with self.export_lock:
+                await loop.run_in_executor(None, self.app.reload)
+            self.tables.clear()
+            self.dirty = False
+            self.conflict = None
+        finally:
+            self.reloading = False
+        return {'version': self.app.d.get('version', 0)}
+
+    # HTTP
+    async def handle_connection(self, reader, writer):
+        """
+        Answer requests on one keep-alive connection until the client closes it.
+        """
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                [method, target, version] = request_line.decode('latin-1').split()
+                headers = {}
+                while True:
+                    line = (await reader.readline()).decode('latin-1').strip()
+                    if line == '':
+                        break
+                    [k, v] = line.split(':', 1)
+                    headers[k.strip().lower()] = v.strip()
+                body = b''
+                if 'content-length' in headers:
+                    body = await reader.readexactly(int(headers['content-length']))
+                content_type = headers.get('content-type', '')
+                status, payload = await self.handle_request(method, target, body, content_type)
+                keep_alive = headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1'
+                writer.write(('HTTP/1.1 ' + str(status) + ' ' + self.reasons[status] + '\r\n'
+                              'Content-Type: application/json\r\n'
+                              'Content-Length: ' + str(len(payload)) + '\r\n'
+                              'Connection: ' + ('keep-alive' if keep_alive else 'close') + '\r\n'
+                              '\r\n').encode('latin-1') + payload)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ValueError, ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def handle_request(self, method, target, body, content_type='application/json'):
+        """
+        Route one request.
+
+        :param method: HTTP method (str)
+        :param target: Request target, path and query (str)
+        :param body: Request body (bytes)
+        :param content_type: Content-Type header of the request (str)
+        :return: HTTP status and JSON payload (tuple)
+        """
+        url = urlsplit(target)
+        parts = [unquote(k) for k in url.path.split('/') if k != '']
+        try:
+            if method != 'GET' and content_type.split(';')[0].strip().lower() != 'application/json':
+                raise HttpError(415, method + ' requests must be sent as Content-Type: application/json')
+            data = json.loads(body) if body else {}
+            if not isinstance(data, dict):
+                raise HttpError(400, 'Request body must be a JSON object')
+            if self.reloading and method != 'GET':
+                raise HttpError(503, 'Reloading ' + self.app.esp_data + ', try again')
+            if parts == ['reload'] and method == 'POST':
+                result = await self.reload()
+            elif parts == ['export'] and method == 'POST':
+                result = await self.export(data)
+            elif self.conflict is not None and method != 'GET':
+                raise HttpError(409, self.conflict + ' POST /reload to drop the unsaved changes.')
+            else:
+                result = self.route(method, parts, parse_qs(url.query), data)
+            if isinstance(result, bytes):
+                return 200, result
+            status = 201 if method == 'POST' and parts != ['reload'] else 200
+            return status, json.dumps(result).encode()
+        except HttpError as e:
+            return e.status, json.dumps({'error': str(e)}).encode()
+        except json.JSONDecodeError as e:
+            return 400, json.dumps({'error': 'Invalid JSON: ' + str(e)}).encode()
+        except Exception as e:
+            return 500, json.dumps({'error': type(e).__name__ + ': ' + str(e)}).encode()
+
+    def route(self, method, parts, query, data):
+        """
+        Perform the resource operation for a request.
+
+        :param method: HTTP method (str)
+        :param parts: URL path segments (str list)
+        :param query: Parsed query string (dict)
+        :param data: Parsed JSON body (dict)
+        :return: JSON-serializable result, or pre-encoded bytes
+        """
+        d = self.app.d
+        if parts == ['projects']:
+            if method == 'GET':
+                return [{'path': k, 'text': d[k]['text']} for k in d['project_paths']]
+            if method == 'POST':
+                self.app.add_project(self.require(data, 'text'))
+                self.mark_dirty(d['project_paths'][0])
+                return {'path': d['project_paths'][0]}
+        elif parts == ['search']:
+            if method == 'GET':
+                return self.search(query.get('q', [''])[0])
+        elif len(parts) == 3 and parts[0] == 'projects' and parts[2] == 'table':
+            if method == 'GET':
+                return self.get_table(self.find_resource(parts[:2]))
+        elif parts[:1] == ['projects'] and (len(parts), parts[-1]) in [(3, 'stories'), (5, 'tasks')]:
+            if method == 'POST':
+                parent = self.find_resource(parts[:-1])
+                if parts[-1] == 'stories':
+                    self.app.add_story(parent, self.require(data, 'text'))
+                    path = d['storys'][0]
+                else:
+                    project = '.'.join(parts[:2])
+                    status = self.check_status(str(data.get('status', 'todo')))
+                    self.app.add_task(project, parent, self.require(data, 'text'), status)
+                    path = d['tasks'][0]
+                self.mark_dirty(path)
+                return {'path': path}
+        elif len(parts) in [2, 4, 6] and parts[0] == 'projects':
+            path = self.find_resource(parts)
+            if method == 'GET':
+                return d[path]
+            if method == 'PATCH':
+                allowed = self.attributes[d[path]['type']]
+                for k in data:
+                    if k not in allowed:
+                        raise HttpError(400, 'Cannot update ' + k + ', allowed: ' + ', '.join(allowed))
+                if 'status' in data:
+                    self.check_status(str(data['status']))
+                for k in data:
+                    self.app.update_attribute(path, k, str(data[k]))
+                self.mark_dirty(path)
+                return d[path]
+            if method == 'DELETE':
+                if len(parts) == 2:
+                    self.app.del_project(path)
+                elif len(parts) == 4:
+                    self.app.del_story(path)
+                else:
+                    self.app.del_task(path)
+                self.mark_dirty(path)
+                return {'deleted': path}
+        else:
+            raise HttpError(404, 'No route for /' + '/'.join(parts))
+        raise HttpError(405, method + ' not allowed on /' + '/'.join(parts))
+
+    # Resources
+    def find_resource(self, parts):
+        """
+        Turn URL segments into a dot path and check that the resource exists.
+
+        :param parts: URL path segments ex. - ['projects', 'cbdC90', 'stories', 'H6qTJg'] (str list)
+        :return: Resource dot path ex. - 'projects.cbdC90.storys.H6qTJg' (str)
+        """
+        path = '.'.join('storys' if k == 'stories' else k for k in parts)
+        if path not in self.app.d or not isinstance(self.app.d[path], dict):
+            raise HttpError(404, 'No resource ' + path)
+        return path
+
+    def is_project_path(self, path):
+        """
+        :param path: Value from a request body
+        :return: True if path looks like a project dot path ex. - 'projects.cbdC90' (bool)
+        """
+        return isinstance(path, str) and path.count('.') == 1 and path.startswith('projects.')
+
+    def require(self, data, key):
+        """
+        Get a required field from a JSON body.
+
+        :param data: Parsed JSON body (dict)
+        :param key: Field name (str)
+        :return: Field value as text (str)
+        """
+        if key not in data:
+            raise HttpError(400, 'Missing field ' + key)
+        return str(data[key])
+
+    def check_status(self, status):
+        """
+        Reject task statuses that get_project_table has no column for.
+
+        :param status: Task status, any case (str)
+        :return: The same status (str)
+        """
+        if status.upper() not in self.statuses:
+            raise HttpError(400, 'Unknown status ' + status + ', allowed: ' + ', '.join(self.statuses))
+        return status
+
+    def get_table(self, project):
+        """
+        Get the encoded scrum table of a project, rendering it only if it changed since last time.
+
+        :param project: Project dot path (str)
+        :return: JSON-encoded table (bytes)
+        """
+        key = project.split('.')[1]
+        if key not in self.tables:
+            self.tables[key] = json.dumps(self.app.get_project_table(project)).encode()
+        return self.tables[key]
+
+    def search(self, text):
+        """
+        Find every resource whose text contains the search text. Search is not case sensitive.
+
+        :param text: Search text (str)
+        :return: Matching resources (list of dicts)
+        """
+        text = text.upper()
+        d = self.app.d
+        results = []
+        for index in ['project_paths', 'storys', 'tasks']:
+            for k in d[index]:
+                if k in d and text in d[k]['text'].upper():
+                    results.append({'path': k, 'type': d[k]['type'], 'text': d[k]['text']})
+        return results
+
+    async def export(self, data):
+        """
+        Print projects to Excel off the event loop, one export at a time.
+
+        :param data: Parsed JSON body with optional 'filename', 'projects' and 'incremental' (dict)
+        :return: Export summary (dict)
+        """
+        filename = data.get('filename', 'SCRUM.xlsx')
+        if not isinstance(filename, str) or os.path.basename(filename) != filename or \
+                not filename.lower().endswith('.xlsx') or filename.startswith('.'):
+            raise HttpError(400, 'filename must be a plain .xlsx file name, ex. - SCRUM.xlsx')
+        path = os.path.join(self.export_dir, filename)
+        loop = asyncio.get_running_loop()
+        async with self.export_lock:
+            if data.get('incremental', False):
+                await loop.run_in_executor(None, self.app.refresh_excel, path)
+                return {'filename': filename, 'projects': list(self.app.d['excel_export']['sheets'])}
+            projects = data.get('projects', list(self.app.d['project_paths']))
+            if not isinstance(projects, list) or not all(self.is_project_path(k) for k in projects):
+                raise HttpError(400, 'projects must be a list of project paths, ex. - ["projects.cbdC90"]')
+            for k in projects:
+                self.find_resource(k.split('.'))
+            await loop.run_in_executor(None, self.app.print_to_excel, projects, path)
+            return {'filename': filename, 'projects': projects}
+
+
+if __name__ == '__main__':
+    S = EspServer('esp_scrum_data.json', 'esp_scrum_data.json')  # Input, output json files.
+    try:
+        asyncio.run(S.serve_forever())
+    except KeyboardInterrupt:
+        pass
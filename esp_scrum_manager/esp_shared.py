@@ -0,0 +1,329 @@
+"""
+ESP Scrum Manager - Shared Boards
+Concurrent access to one scrum document, from several threads or several processes.
+"""
+
+import os
+import json
+import time
+import socket
+import threading
+from esp_scrum import EspApp, profiled
+
+
+class VersionConflictError(Exception):
+    """
+    The JSON file was saved by someone else after this app loaded it.
+    """
+
+
+class FileLock:
+    """
+    Cross-process lock held by creating '<data_file>.lock' exclusively.
+
+    Works anywhere os.open(O_EXCL) does, so Windows and network shares need no extra packages.
+    The lock file holds the owner's pid and host. A lock left behind by a crashed save is taken
+    over once its owner is gone (same host, POSIX) or it is older than stale_after seconds.
+    """
+
+    def __init__(self, data_file, timeout=10.0, poll=0.05, stale_after=60.0):
+        """
+        :param data_file: Path to the JSON file being guarded (str)
+        :param timeout: Seconds to wait for the lock before giving up (float)
+        :param poll: Seconds between attempts (float)
+        :param stale_after: Age in seconds after which a lock is treated as abandoned (float)
+        """
+        self.path = data_file + '.lock'
+        self.timeout = timeout
+        self.poll = poll
+        self.stale_after = stale_after
+        self.owner = str(os.getpid()) + ' ' + socket.gethostname()
+
+    def __enter__(self):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                if self.remove_stale():
+                    continue
+                if time.monotonic() > deadline:
+                    raise TimeoutError('Could not lock ' + self.path + ', someone else is saving.')
+                time.sleep(self.poll)
+            else:
+                os.write(fd, self.owner.encode())
+                os.close(fd)
+                return self
+
+    def remove_stale(self):
+        """
+        Delete the lock file if its owner crashed without removing it.
+
+        :return: True if a stale lock was removed (bool)
+        """
+        try:
+            age = time.time() - os.path.getmtime(self.path)
+            with open(self.path, 'r') as f:
+                owner = f.read()
+        except OSError:
+            return False  # Released meanwhile
+        stale = age > self.stale_after
+        [pid, _, host] = owner.partition(' ')
+        if not stale and os.name == 'posix' and host == socket.gethostname() and pid.isdigit():
+            try:
+                os.kill(int(pid), 0)
+            except ProcessLookupError:
+                stale = True
+            except PermissionError:
+                pass  # Alive, run by another user
+        if not stale:
+            return False
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+        return True
+
+    def __exit__(self, *exc):
+        os.remove(self.path)
+
+
+class DocumentLock:
+    """
+    Shared/exclusive lock over the whole document.
+
+    Resource operations hold it shared, so they only wait on their own project lock.
+    Saving and reloading hold it exclusive, so self.d is never walked while it changes.
+    Shared holds may nest; waiting writers do not block new shared holds.
+    """
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.readers = 0
+        self.writer = False
+
+    def acquire_shared(self):
+        with self.cond:
+            while self.writer:
+                self.cond.wait()
+            self.readers += 1
+
+    def release_shared(self):
+        with self.cond:
+            self.readers -= 1
+            if self.readers == 0:
+                self.cond.notify_all()
+
+    def acquire_exclusive(self):
+        self.cond.acquire()
+        while self.writer or self.readers:
+            self.cond.wait()
+        self.writer = True
+        self.cond.release()
+
+    def release_exclusive(self):
+        with self.cond:
+            self.writer = False
+            self.cond.notify_all()
+
+
+class SharedEspApp(EspApp):
+    """
+    EspApp that several workers can update at once.
+
+    In-process: every add_*, del_* and update_attribute call takes a lock for its project, so
+    workers on different projects run side by side and workers on one project take turns.
+    The flat index lists (resources, project_paths, storys, tasks) have their own short lock.
+    Lock order is always document -> project -> index.
+
+    Between processes: self.d['version'] is bumped on every save, by EspApp too. Saving checks
+    the version on disk under a FileLock, and raises VersionConflictError instead of overwriting
+    changes saved by someone else since this app loaded the file. Call reload() and redo the work.
+    """
+
+    def __init__(self, esp_data, output_file, lock_timeout=10.0):
+        """
+        Read the JSON file and initialize runtime variables and locks.
+
+        :param esp_data: Path to JSON file to read (str)
+        :param output_file: Path to JSON file to write (str)
+        :param lock_timeout: Seconds to wait for the file lock when saving (float)
+        """
+        super().__init__(esp_data, output_file)
+        self.esp_data = esp_data
+        self.lock_timeout = lock_timeout
+        self.doc_lock = DocumentLock()
+        self.index_lock = threading.RLock()
+        self.project_locks = {}
+        self.project_locks_guard = threading.Lock()
+        self.save_lock = threading.Lock()
+        self.reserved_names = set()
+
+    # Locks
+    def project_lock(self, path):
+        """
+        Get the lock for the project a resource belongs to.
+
+        :param path: Project id or any resource dot path ex. - 'projects.cbdC90.storys.H6qTJg' (str)
+        :return: Lock for that project (threading.RLock)
+        """
+        project = path.split('.')[1] if path.startswith('projects.') else path
+        with self.project_locks_guard:
+            if project not in self.project_locks:
+                self.project_locks[project] = threading.RLock()
+            return self.project_locks[project]
+
+    def locked(self, project, method, *args):
+        """
+        Run a resource method while holding the document (shared) and project locks.
+
+        :param project: Project id or resource dot path (str)
+        :param method: Unbound EspApp method (function)
+        :param args: Arguments for method
+        :return: Return value of method
+        """
+        self.doc_lock.acquire_shared()
+        try:
+            with self.project_lock(project):
+                return method(self, *args)
+        finally:
+            self.doc_lock.release_shared()
+
+    # Resource Methods
+    def add_project(self, text):
+        self.doc_lock.acquire_shared()
+        try:
+            EspApp.add_project(self, text)
+        finally:
+            self.doc_lock.release_shared()
+
+    def add_story(self, project, text):
+        self.locked(project, EspApp.add_story, project, text)
+
+    def add_task(self, project, story, text, status='todo'):
+        self.locked(project, EspApp.add_task, project, story, text, status)
+
+    def del_project(self, project_id):
+        self.locked(project_id, EspApp.del_project, project_id)
+
+    def del_story(self, full_story_id):
+        self.locked(full_story_id, EspApp.del_story, full_story_id)
+
+    def del_task(self, full_task_id):
+        self.locked(full_task_id, EspApp.del_task, full_task_id)
+
+    def update_attribute(self, resource, attribute, value):
+        self.locked(resource, EspApp.update_attribute, resource, attribute, value)
+
+    def get_project_table(self, target_project):
+        self.doc_lock.acquire_shared()
+        try:
+            with self.project_lock(target_project), self.index_lock:
+                return EspApp.get_project_table(self, target_project)
+        finally:
+            self.doc_lock.release_shared()
+
+    def get_project(self, text):
+        with self.index_lock:
+            return EspApp.get_project(self, text)
+
+    def get_story(self, project, text):
+        with self.index_lock:
+            return EspApp.get_story(self, project, text)
+
+    def get_task(self, text):
+        with self.index_lock:
+            return EspApp.get_task(self, text)
+
+    def roll_name(self, forbidden_list):
+        """
+        Get a new resource name, reserved so no other worker can roll it before it is indexed.
+
+        :param forbidden_list: list of entries the random name cannot be.
+        """
+        with self.index_lock:
+            name = EspApp.roll_name(self, set(forbidden_list) | self.reserved_names)
+            self.reserved_names.add(name)
+            return name
+
+    def add_to_index(self, index, path):
+        with self.index_lock:
+            EspApp.add_to_index(self, index, path)
+            self.reserved_names.discard(path.split('.')[-1])
+
+    def remove_from_index(self, index, path):
+        with self.index_lock:
+            EspApp.remove_from_index(self, index, path)
+
+    def mark_changed(self, path):
+        with self.index_lock:
+            EspApp.mark_changed(self, path)
+
+    def take_changed(self):
+        with self.index_lock:
+            return EspApp.take_changed(self)
+
+    # Input/Output Methods
+    def reload(self):
+        """
+        Throw away in-memory changes and read the JSON file again, e.g. after a VersionConflictError.
+        """
+        with self.save_lock:
+            self.doc_lock.acquire_exclusive()
+            try:
+                self.d = self.read_esp_data(self.esp_data)
+                self.d.setdefault('excel_export', {'file': '', 'sheets': {}, 'changed': [], 'all_projects': True})
+            finally:
+                self.doc_lock.release_exclusive()
+
+    @profiled
+    def write_esp_data(self, data_file):
+        """
+        Save to JSON if nobody else has saved over the version this app loaded.
+
+        The document is only locked while it is serialized; waiting for the file lock and writing
+        happen after, so workers can keep changing resources. The file is written to a temp file
+        and moved into place, so readers never see half a file.
+
+        :param data_file: Target json file (str)
+        """
+        with self.save_lock:
+            self.doc_lock.acquire_exclusive()
+            try:
+                version = self.d.get('version', 0)
+                text = json.dumps(dict(self.d, version=version + 1), indent=4, sort_keys=True)
+            finally:
+                self.doc_lock.release_exclusive()
+            with FileLock(data_file, self.lock_timeout):
+                if os.path.exists(data_file):
+                    with open(data_file, 'r') as f:
+                        saved_version = json.load(f).get('version', 0)
+                    if saved_version != version:
+                        raise VersionConflictError(data_file + ' is at version ' + str(saved_version) +
+                                                   ', this app loaded version ' + str(version) + '.')
+                with open(data_file + '.tmp', 'w') as f:
+                    f.write(text)
+                os.replace(data_file + '.tmp', data_file)
+            self.d['version'] = version + 1
+
+
+def run_checked(esp_data, output_file):
+    """
+    Run the console app on a shared board. If the session can't be saved, because someone else
+    saved the file during it or the file can't be locked or written, this session's changes are
+    saved next to it as '<name>.conflict.json' instead.
+
+    :param esp_data: Path to JSON file to read (str)
+    :param output_file: Path to JSON file to write (str)
+    """
+    A = SharedEspApp(esp_data, output_file)
+    try:
+        A.run()
+    except (VersionConflictError, OSError) as e:  # OSError includes the FileLock TimeoutError
+        A.output_file = os.path.splitext(output_file)[0] + '.conflict.json'
+        EspApp.write_esp_data(A, A.output_file)
+        print('Error: ' + str(e) + ' Your changes were saved to ' + A.output_file + '.')
+
+
+if __name__ == '__main__':
+    run_checked('esp_scrum_data.json', 'esp_scrum_data.json')  # Input, output json files.
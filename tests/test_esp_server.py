@@ -0,0 +1,157 @@
+"""
+Tests for esp_server: the HTTP/JSON service, run on a free port on localhost.
+
+Run from the repository folder: python -m unittest discover tests
+"""
+
+import os
+import sys
+import json
+import shutil
+import asyncio
+import tempfile
+import unittest
+import http.client
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'esp_scrum_manager'))
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+from bench_data import make_board, write_json
+from esp_scrum import EspApp
+from esp_server import EspServer
+
+
+class EspServerTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.tmp = tempfile.mkdtemp(prefix='esp_test_')
+        self.board_file = os.path.join(self.tmp, 'board.json')
+        write_json(make_board(2, 1, 2), self.board_file)
+        self.server = EspServer(self.board_file, self.board_file)
+        self.server.port = 0
+        self.server.flush_delay = 0.05
+        await self.server.start()
+
+    async def asyncTearDown(self):
+        await self.server.stop()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def send(self, method, path, body=None, content_type='application/json'):
+        """
+        Send one request with http.client, in a worker thread so the server's loop keeps running.
+
+        :return: HTTP status and decoded JSON payload (tuple)
+        """
+        def request():
+            c = http.client.HTTPConnection('127.0.0.1', self.server.port, timeout=10)
+            headers = {'Content-Type': content_type} if content_type else {}
+            c.request(method, path, None if body is None else json.dumps(body), headers)
+            r = c.getresponse()
+            result = (r.status, json.loads(r.read()))
+            c.close()
+            return result
+        return asyncio.get_running_loop().run_in_executor(None, request)
+
+    async def add_task(self, status='todo'):
+        """
+        Add a project, a story and a task through the service.
+
+        :return: Project, story and task URLs (tuple)
+        """
+        _, p = await self.send('POST', '/projects', {'text': 'Test Project'})
+        project = '/' + p['path'].replace('.', '/')
+        _, s = await self.send('POST', project + '/stories', {'text': 'Test Story'})
+        story = '/' + s['path'].replace('.', '/').replace('storys', 'stories')
+        status, t = await self.send('POST', story + '/tasks', {'text': 'Test Task', 'status': status})
+        self.assertEqual(status, 201)
+        return project, story, '/' + t['path'].replace('.', '/').replace('storys', 'stories')
+
+    def saved(self):
+        with open(self.board_file, 'r') as f:
+            return json.load(f)
+
+    async def test_crud(self):
+        project, story, task = await self.add_task('Review')
+        status, t = await self.send('GET', task)
+        self.assertEqual((status, t['text'], t['status']), (200, 'Test Task', 'Review'))
+        status, t = await self.send('PATCH', task, {'status': 'Complete', 'notes': 'done'})
+        self.assertEqual((status, t['status'], t['notes']), (200, 'Complete', 'done'))
+        status, projects = await self.send('GET', '/projects')
+        self.assertIn('Test Project', [k['text'] for k in projects])
+        status, found = await self.send('GET', '/search?q=test%20task')
+        self.assertEqual([k['type'] for k in found], ['task'])
+        self.assertEqual((await self.send('DELETE', story))[0], 200)
+        self.assertEqual((await self.send('GET', task))[0], 404)
+        self.assertEqual((await self.send('DELETE', project))[0], 200)
+        self.assertEqual((await self.send('GET', project))[0], 404)
+
+    async def test_errors(self):
+        project, story, task = await self.add_task()
+        self.assertEqual((await self.send('GET', '/'))[0], 404)
+        self.assertEqual((await self.send('GET', '/projects/nope'))[0], 404)
+        self.assertEqual((await self.send('PUT', '/projects'))[0], 405)
+        self.assertEqual((await self.send('POST', '/projects', {}))[0], 400)
+        self.assertEqual((await self.send('POST', '/projects', [1]))[0], 400)
+        self.assertEqual((await self.send('POST', story + '/tasks', {'text': 'x', 'status': 5}))[0], 400)
+        self.assertEqual((await self.send('PATCH', task, {'status': 'Done'}))[0], 400)
+        self.assertEqual((await self.send('PATCH', task, {'type': 'story'}))[0], 400)
+        self.assertEqual((await self.send('POST', '/projects', {'text': 'x'}, 'text/plain'))[0], 415)
+        self.assertEqual((await self.send('POST', '/reload', None, None))[0], 415)
+        self.assertEqual((await self.send('GET', project + '/table'))[0], 200)
+
+    async def test_table_cache_dropped_after_patch(self):
+        project, story, task = await self.add_task()
+        _, table = await self.send('GET', project + '/table')
+        self.assertEqual(table[2][1], 'Test Task ')
+        await self.send('PATCH', task, {'text': 'Renamed', 'status': 'Blocked'})
+        _, table = await self.send('GET', project + '/table')
+        self.assertEqual(table[2][1], '')
+        self.assertEqual(table[2][4], 'Renamed ')
+
+    async def test_write_behind_save(self):
+        self.server.flush_delay = 0.3
+        _, p = await self.send('POST', '/projects', {'text': 'Batched'})
+        await self.send('PATCH', '/' + p['path'].replace('.', '/'), {'text': 'Batched 2'})
+        self.assertNotIn(p['path'], self.saved()['project_paths'])
+        await asyncio.sleep(0.6)
+        saved = self.saved()
+        self.assertEqual(saved['projects'][p['path'].split('.')[1]]['text'], 'Batched 2')
+        self.assertEqual(saved['version'], 1)  # Both changes in one save
+
+    async def test_conflict_until_reload(self):
+        await self.send('POST', '/projects', {'text': 'Ours'})
+        other = EspApp(self.board_file, self.board_file)
+        other.add_project('Theirs')
+        other.write_esp_data(self.board_file)
+        await asyncio.sleep(0.3)
+        self.assertIsNotNone(self.server.conflict)
+        self.assertEqual((await self.send('POST', '/projects', {'text': 'Refused'}))[0], 409)
+        self.assertEqual((await self.send('GET', '/projects'))[0], 200)
+        self.assertEqual((await self.send('POST', '/reload'))[0], 200)
+        self.assertEqual((await self.send('POST', '/projects', {'text': 'After'}))[0], 201)
+        await asyncio.sleep(0.3)
+        texts = [k['text'] for k in self.saved()['projects'].values()]
+        self.assertIn('Theirs', texts)
+        self.assertIn('After', texts)
+        self.assertNotIn('Ours', texts)
+
+    async def test_mutations_refused_while_reloading(self):
+        self.server.reloading = True
+        self.assertEqual((await self.send('POST', '/projects', {'text': 'x'}))[0], 503)
+        self.assertEqual((await self.send('GET', '/projects'))[0], 200)
+
+    async def test_export(self):
+        paths = self.server.app.d['project_paths']
+        results = await asyncio.gather(self.send('POST', '/export', {'filename': 'a.xlsx'}),
+                                       self.send('POST', '/export', {'filename': 'a.xlsx', 'projects': paths[:1]}))
+        self.assertEqual([k[0] for k in results], [201, 201])
+        self.assertTrue(os.path.exists(os.path.join(self.tmp, 'a.xlsx')))
+        for body in [{'filename': '../a.xlsx'}, {'filename': os.path.join(self.tmp, 'b.xlsx')},
+                     {'filename': 'a.txt'}, {'projects': 'abc'}, {'projects': [1]},
+                     {'projects': [self.server.app.d['storys'][0]]}]:
+            self.assertEqual((await self.send('POST', '/export', body))[0], 400, body)
+        self.assertEqual((await self.send('POST', '/export', {'projects': ['projects.nope']}))[0], 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+"""
+Tests for esp_shared: concurrent updates through SharedEspApp, version conflicts and file locks.
+
+Run from the repository folder: python -m unittest discover tests
+"""
+
+import os
+import sys
+import json
+import shutil
+import socket
+import tempfile
+import unittest
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'esp_scrum_manager'))
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+from bench_data import make_board, write_json
+from esp_scrum import EspApp
+from esp_shared import SharedEspApp, VersionConflictError, FileLock
+
+
+def check_consistency(test, d):
+    """
+    Check that the flat indexes and the project tree list exactly the same resources.
+
+    :param test: Running test (unittest.TestCase)
+    :param d: ESP scrum data (dict)
+    """
+    projects = ['projects.' + p for p in d['projects']]
+    storys = [k + '.storys.' + s for k in projects for s in d[k]['storys']]
+    tasks = [k + '.tasks.' + t for k in storys for t in d[k]['tasks']]
+    test.assertEqual(sorted(d['project_paths']), sorted(projects))
+    test.assertEqual(sorted(d['storys']), sorted(storys))
+    test.assertEqual(sorted(d['tasks']), sorted(tasks))
+    names = [k.split('.')[-1] for k in projects + storys + tasks]
+    test.assertEqual(sorted(d['resources']), sorted(names))
+    test.assertEqual(len(set(names)), len(names))
+
+
+class SharedEspAppTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp(prefix='esp_test_')
+        self.board_file = os.path.join(self.tmp, 'board.json')
+        write_json(make_board(4, 2, 3), self.board_file)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_thread_pool_keeps_indexes_consistent(self):
+        a = SharedEspApp(self.board_file, self.board_file)
+        projects = list(a.d['project_paths'])
+
+        def work(i):
+            project = projects[i % len(projects)]
+            story = [k for k in a.d['storys'] if k.startswith(project + '.')][0]
+            a.add_story(project, 'Story ' + str(i))
+            a.add_task(project, story.split('.')[-1], 'Task ' + str(i), 'Review')
+            a.update_attribute(project, 'text', 'Project ' + str(i))
+            if i % 5 == 0:
+                a.del_task([k for k in a.d['tasks'] if k.startswith(story + '.')][0])
+            a.write_esp_data(self.board_file)
+
+        with ThreadPoolExecutor(8) as pool:
+            list(pool.map(work, range(40)))
+        a.del_project(projects[0])
+        a.write_esp_data(self.board_file)
+        check_consistency(self, a.d)
+        with open(self.board_file, 'r') as f:
+            saved = json.load(f)
+        check_consistency(self, EspApp(self.board_file, self.board_file).d)
+        self.assertEqual(saved['version'], a.d['version'])
+        added = [s['text'] for p in saved['projects'].values() for s in p['storys'].values()
+                 if s['text'].startswith('Story ')]
+        self.assertEqual(len(added), 30)  # 40 added, minus the 10 of the deleted project
+
+    def test_plain_save_causes_conflict(self):
+        shared = SharedEspApp(self.board_file, self.board_file)
+        plain = EspApp(self.board_file, self.board_file)
+        plain.add_project('Plain')
+        plain.write_esp_data(self.board_file)
+        shared.add_project('Shared')
+        with self.assertRaises(VersionConflictError):
+            shared.write_esp_data(self.board_file)
+        shared.reload()
+        shared.add_project('Shared')
+        shared.write_esp_data(self.board_file)
+        texts = [v['text'] for v in EspApp(self.board_file, self.board_file).d['projects'].values()]
+        self.assertIn('Plain', texts)
+        self.assertIn('Shared', texts)
+
+    @unittest.skipUnless(os.name == 'posix', 'owner pids are only checked on POSIX')
+    def test_stale_lock_of_dead_process_is_taken_over(self):
+        p = subprocess.Popen([sys.executable, '-c', 'pass'])
+        p.wait()
+        with open(self.board_file + '.lock', 'w') as f:
+            f.write(str(p.pid) + ' ' + socket.gethostname())
+        with FileLock(self.board_file, timeout=0.5):
+            pass
+        self.assertFalse(os.path.exists(self.board_file + '.lock'))
+
+    def test_live_lock_times_out(self):
+        with open(self.board_file + '.lock', 'w') as f:
+            f.write('1 another-host')
+        a = SharedEspApp(self.board_file, self.board_file, lock_timeout=0.2)
+        a.add_project('Waiting')
+        with self.assertRaises(TimeoutError):
+            a.write_esp_data(self.board_file)
+        os.utime(self.board_file + '.lock', (0, 0))  # Abandoned long ago
+        a.write_esp_data(self.board_file)
+        self.assertFalse(os.path.exists(self.board_file + '.lock'))
+
+
+if __name__ == '__main__':
+    unittest.main()